@@ -0,0 +1,176 @@
+import threading
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from catalog import SERIES_ANALYSES
+from correlation import station_readings
+
+# Readings further than this many robust standard deviations from their seasonal median
+# are flagged
+THRESHOLD = 4.0
+
+# MAD of normally distributed data times this is its standard deviation
+MAD_SCALE = 1.4826
+
+# A baseline cell pools the same hour of day over every year and this many days either
+# side of the day of year; cells with fewer readings than MIN_READINGS stay blank
+SEASON_DAYS = 15
+MIN_READINGS = 10
+
+# Readings per station the network scan looks at, counted back from its newest reading
+LATEST_HOURS = 72
+
+# median and scale are (366 days of year, 24 hours) arrays; scale is MAD_SCALE * MAD
+Baseline = namedtuple('Baseline', ['median', 'scale'])
+
+
+# Day of year (0-365) and hour of day of datetime64 times
+def season_index(times):
+    hours = np.asarray(times).astype('datetime64[h]')
+    days = hours.astype('datetime64[D]')
+    day_of_year = (days - hours.astype('datetime64[Y]').astype('datetime64[D]')).astype(np.int64)
+    return day_of_year, (hours - days).astype(np.int64)
+
+# Robust seasonal baseline of one series: every reading goes into a (year, day of year,
+# hour) grid once, and the median/MAD of each cell's window of days across all years is
+# taken in one vectorized call over the whole grid
+def seasonal_baseline(times, values, season_days=SEASON_DAYS, min_readings=MIN_READINGS):
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    times, values = np.asarray(times)[present], values[present]
+    if not len(values):
+        empty = np.full((366, 24), np.nan)
+        return Baseline(empty, empty.copy())
+
+    years = np.asarray(times).astype('datetime64[Y]').astype(np.int64)
+    year_codes, _ = pd.factorize(years)
+    day_of_year, hour = season_index(times)
+    grid = np.full((year_codes.max() + 1, 366, 24), np.nan)
+    grid[year_codes, day_of_year, hour] = values
+
+    # Wrap the days around the year end so early January pools with late December
+    padded = np.concatenate([grid[:, -season_days:], grid, grid[:, :season_days]], axis=1)
+    windows = sliding_window_view(padded, 2 * season_days + 1, axis=1)
+    pooled = windows.transpose(1, 2, 0, 3).reshape(366, 24, -1)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN cells
+        median = np.nanmedian(pooled, axis=2)
+        scale = MAD_SCALE * np.nanmedian(np.abs(pooled - median[..., None]), axis=2)
+    sparse = (~np.isnan(pooled)).sum(axis=2) < min_readings
+    median[sparse] = np.nan
+    # A flat cell (MAD 0) cannot say how unusual a change is
+    scale[sparse | ~(scale > 0)] = np.nan
+    return Baseline(median, scale)
+
+# Robust z-score of every reading against its baseline cell
+def score(baseline, times, values):
+    day_of_year, hour = season_index(times)
+    return (np.asarray(values, dtype=np.float64) - baseline.median[day_of_year, hour]) / baseline.scale[day_of_year, hour]
+
+
+class AnomalyEngine:
+    # Seasonal baselines of the hourly station series (WAT, RAD, MAG), computed once per
+    # file version and kept per worker. Series are (location, code) pairs.
+
+    def __init__(self, cache, catalog, threshold=THRESHOLD):
+        self.cache = cache
+        self.catalog = catalog
+        self.threshold = threshold
+        self._baselines = {}
+        self._flags = {}
+        self._lock = threading.Lock()
+
+    def series(self):
+        return [(location, self.catalog.code_for(analysis, location))
+                for analysis in SERIES_ANALYSES for location in sorted(self.catalog.stations(analysis))]
+
+    def baseline(self, location, code):
+        version = self.cache.version(location, code)
+        with self._lock:
+            cached = self._baselines.get((location, code))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        baseline = seasonal_baseline(*station_readings(self.cache, location, code))
+        with self._lock:
+            self._baselines[(location, code)] = (version, baseline)
+        return baseline
+
+    # Every flagged reading of one series: a frame of datetime, value, baseline and z
+    def flags(self, location, code):
+        version = self.cache.version(location, code)
+        with self._lock:
+            cached = self._flags.get((location, code))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        times, values = station_readings(self.cache, location, code)
+        baseline = self.baseline(location, code)
+        z = score(baseline, times, values)
+        flagged = np.abs(z) > self.threshold
+        day_of_year, hour = season_index(times[flagged])
+        result = pd.DataFrame({
+            'datetime': times[flagged].astype('datetime64[ns]'),
+            'value': values[flagged],
+            'baseline': baseline.median[day_of_year, hour],
+            'z': z[flagged],
+        })
+        with self._lock:
+            self._flags[(location, code)] = (version, result)
+        return result
+
+    # Score the newest `hours` readings of every series in one pass: the readings and the
+    # stacked baselines are gathered into flat arrays and scored with a single fancy-index.
+    # Returns the flagged readings, largest excursion first.
+    def scan(self, hours=LATEST_HOURS):
+        series = self.series()
+        medians = np.stack([self.baseline(*s).median for s in series]) if series else np.empty((0, 366, 24))
+        scales = np.stack([self.baseline(*s).scale for s in series]) if series else np.empty((0, 366, 24))
+
+        owners, times, values = [], [], []
+        for index, (location, code) in enumerate(series):
+            latest = self._latest(location, code, hours)
+            owners.append(np.full(len(latest[0]), index))
+            times.append(latest[0])
+            values.append(latest[1])
+        if not owners:
+            return pd.DataFrame(columns=['location', 'code', 'datetime', 'value', 'baseline', 'z'])
+        owners = np.concatenate(owners)
+        times = np.concatenate(times)
+        values = np.concatenate(values)
+
+        day_of_year, hour = season_index(times)
+        baseline = medians[owners, day_of_year, hour]
+        z = (values - baseline) / scales[owners, day_of_year, hour]
+        flagged = np.flatnonzero(np.abs(z) > self.threshold)
+        flagged = flagged[np.argsort(-np.abs(z[flagged]), kind='stable')]
+        return pd.DataFrame({
+            'location': [series[i][0] for i in owners[flagged]],
+            'code': [series[i][1] for i in owners[flagged]],
+            'datetime': times[flagged].astype('datetime64[ns]'),
+            'value': values[flagged],
+            'baseline': baseline[flagged],
+            'z': z[flagged],
+        })
+
+    # Readings of the last `hours` before the series' newest one, from its latest years
+    def _latest(self, location, code, hours):
+        years = self.cache.get_years(location, code)
+        times, values = [], []
+        for yy in sorted(years, reverse=True):
+            data = years[yy]
+            if not len(data.times):
+                continue
+            if not times:
+                start = np.asarray(data.times[-1]).astype('datetime64[h]') - np.timedelta64(hours - 1, 'h')
+            keep = np.asarray(data.times).astype('datetime64[h]') >= start
+            times.insert(0, np.asarray(data.times)[keep].astype('datetime64[h]'))
+            values.insert(0, np.asarray(data.values, dtype=np.float64)[keep])
+            if np.asarray(data.times[0]).astype('datetime64[h]') < start:
+                break
+        if not times:
+            return np.array([], dtype='datetime64[h]'), np.array([], dtype=np.float64)
+        return np.concatenate(times), np.concatenate(values)
@@ -1,35 +1,179 @@
-app = Dash(__name__, external_stylesheets=[...])
-
-import pathlib
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output
+from plotly.subplots import make_subplots
+from dash import Dash, dash_table, dcc, html, Input, Output, State, no_update
+from dash.exceptions import PreventUpdate
+from flask import abort, jsonify, request
 from datetime import datetime
 import os
+from pathlib import Path
 
+from anomaly import LATEST_HOURS, THRESHOLD, AnomalyEngine
+from catalog import SERIES_ANALYSES, SERIES_FILE, Catalog, preload
+from comparison import ComparisonService
+from correlation import CorrelationEngine
+from downsample import downsample
+from figure_cache import FigureCache, memoized_figure
+from latest import LatestIndex
+from live_feed import LiveFeed
+from loader import as_float64, month_day
+from pyramid import pick_level
+from rolling import RollingStatistics
+from series_append import append_readings
+from series_cache import SeriesCache, load_series, tail
+from series_stats import merge_summaries, merge_years, year_summary
+from series_store import SeriesStore
+from spatial_index import STATION_COORDINATES, EventIndex
+from superposed_epoch import AFTER_DAYS, BEFORE_DAYS, EpochStacker
 
 
+# Directory holding the {location}{yy}_{code}.csv files
+DATA_PATH = Path(__file__).parent / "data"
 
-# Declare server for Heroku deployment. Needed for Procfile.
-server = app.server
 
+# Rebuild the frame used by the plotting code from cached arrays. Times are widened to
+# datetime64[ns]: the store keeps hours, parsed CSVs nanoseconds, and a station can have
+# years from both.
+def series_frame(data):
+    df = pd.DataFrame({'datetime': np.asarray(data.times).astype('datetime64[ns]'),
+                       'month_day': np.asarray(data.month_day).astype('datetime64[ns]'),
+                       'value': as_float64(data.values)})
+    df['year'] = df['datetime'].dt.year
+    return df
+
+# Width of the graph in pixels; downsampled traces keep at most this many points
+PLOT_WIDTH = 1200
+
+# Frequency choices that downsample each trace instead of keeping every n-th row
+DOWNSAMPLING_METHODS = ('lttb', 'minmax')
+
+# Keep every n-th row for the numeric frequency choices
+def stride(df, frequency):
+    if frequency in DOWNSAMPLING_METHODS:
+        return df
+    return df.iloc[::frequency, :]
+
+# Reduce one trace to PLOT_WIDTH points for the downsampling frequency choices
+def reduce_trace(df, frequency, x):
+    if frequency not in DOWNSAMPLING_METHODS:
+        return df
+    return df.iloc[downsample(df[x].to_numpy(), df['value'].to_numpy(), frequency, PLOT_WIDTH)]
+
+# Per-year mean/min/max/start/end of every year file of a station series, computed once
+# per file version
+def station_stats(location, code, series):
+    stats = {}
+    for yy in series:
+        stats.update(series_cache.derived(location, code, yy, 'year_stats',
+                                          lambda stamp, data: year_summary(series_frame(data)),
+                                          lambda summary, data, start: merge_summaries(summary, year_summary(series_frame(tail(data, start))))))
+    return stats
+
+# Renderers for the time-series traces
+RENDERERS = ('webgl', 'svg')
+
+# Hover date formats for WebGL traces. The continuous view draws every year over 2000,
+# so it leaves the year to the trace name.
+HOVER_DATE_CONTINUOUS = '%m-%d %H:%M'
+HOVER_DATE_YEARLY = '%Y-%m-%d %H:%M:%S'
+
+# Epoch milliseconds, which plotly reads as dates on a date-typed axis
+def epoch_ms(values):
+    return np.asarray(values).astype('datetime64[ms]').astype(np.int64)
+
+# Point arrays of a line trace as the selected renderer sends them: 'webgl' sends x as
+# epoch milliseconds and y at float32 precision, and lets the browser format the hover
+# date; 'svg' sends the values as they are plus a per-point text array of timestamps.
+def trace_points(renderer, x, y, times=None):
+    if renderer == 'webgl':
+        return {'x': epoch_ms(x), 'y': as_float64(np.asarray(y, dtype=np.float32))}
+    points = {'x': x, 'y': y}
+    if times is not None:
+        points['text'] = pd.Series(times).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return points
+
+# Build a line trace for the selected renderer
+def line_trace(renderer, x, y, times=None, date_format='%Y-%m-%d %H:%M:%S', hover_extra='', **kwargs):
+    points = trace_points(renderer, x, y, times)
+    if renderer == 'webgl':
+        return go.Scattergl(hovertemplate=f'%{{x|{date_format}}}<br>%{{y}}{hover_extra}', **points, **kwargs)
+    if 'text' in points:
+        hover_extra = '<br>%{text}' + hover_extra
+    return go.Scatter(hovertemplate='%{x}<br>%{y}' + hover_extra, **points, **kwargs)
+
+# Parsed series are cached per worker and only re-read when a file changes. Series
+# converted by `python src/series_store.py` are memory-mapped instead of parsed.
+# The catalog is scanned once here and kept current by its watcher thread (started below);
+# it tells the cache and the dropdowns which files exist.
+catalog = Catalog(DATA_PATH)
+series_cache = SeriesCache(DATA_PATH, load_series, SeriesStore(DATA_PATH / "store"), catalog)
+
+# Seasonal baselines of the hourly series, used to flag unusual readings
+anomaly_engine = AnomalyEngine(series_cache, catalog)
 
+# Warm every station series before serving, trading import time for a first request as
+# fast as steady state. Opt in with PRELOAD_SERIES=1 and run gunicorn with --preload so
+# the workers share what the master process parsed.
+def warm_station(location, code, series):
+    station_stats(location, code, series)
+    for yy in series:
+        series_cache.pyramid(location, code, yy)
+    if code in SERIES_ANALYSES:
+        anomaly_engine.flags(location, code)
 
+# With a preload this module runs in the gunicorn master, which only forks: the watcher
+# is started in each worker instead. Without one it runs in the worker itself.
+if os.environ.get('PRELOAD_SERIES') == '1':
+    preload(catalog, series_cache, derive=(warm_station,))
+    os.register_at_fork(after_in_child=catalog.start_watcher)
+else:
+    catalog.start_watcher()
 
-# Load your data
-def load_data(files):
-    dataframes = {}
-    for i, file in enumerate(files):
-        df = pd.read_csv(file)
-        try:
-            df['date'] = pd.to_datetime(df['date'])
-            df['datetime'] = pd.to_datetime(df['date'].dt.date.astype(str) + ' ' + df['hour'])
-            df['month_day'] = df['datetime'].apply(lambda x: x.replace(year=2000))
-            df['year'] = df['datetime'].dt.year
-        except Exception as e:
-            print(f"Error while processing file {file}: {e}")
-        dataframes[i] = df
-    return dataframes
+# Live mode polls for readings newer than the client's last point and appends just those
+# to the plotted traces
+LIVE_INTERVAL_MS = 15000
+live_feed = LiveFeed(series_cache)
+
+# Station correlation matrices, recomputed only when a station file changes
+correlation_engine = CorrelationEngine(series_cache, catalog)
+
+# Two-series comparisons, with the aligned pair kept until either file changes
+comparison_service = ComparisonService(series_cache)
+
+# Hourly series that can be compared, as "{location}_{code}" values
+COMPARED_ANALYSES = ('WAT', 'RAD', 'MAG')
+
+# Lag ranges offered for the cross-correlation scan
+LAG_DAYS = (1, 3, 7, 14, 30, 60)
+
+# Seconds between re-scans of the network for the alert table
+ANOMALY_INTERVAL_MS = 60000
+
+# Newest reading of every hourly series, read from file tails and kept until a file changes
+latest_index = LatestIndex(catalog)
+STATUS_INTERVAL_MS = 60000
+
+# Series this many hours behind the newest reading of the network are shown as late
+STALE_HOURS = 24
+
+# Rolling mean/z-score/correlation overlays of the station graph, on the hourly grid
+rolling_statistics = RollingStatistics(series_cache)
+ROLLING_WINDOW_DAYS = (7, 30, 90)
+
+# Earthquakes from earthquakes.db near each station, marked on the station graph. The
+# radius choices are offered next to the marker toggle.
+event_index = EventIndex()
+EVENT_RADIUS_KM = (50, 100, 200, 300)
+
+# Station series stacked around earthquake times, from BEFORE_DAYS before to AFTER_DAYS
+# after each event
+epoch_stacker = EpochStacker(series_cache, event_index)
+EPOCH_MAGNITUDES = (2, 3, 4, 5, 6)
+
+# Built figures are memoized per worker; set FIGURE_CACHE_DIR to share them between
+# gunicorn workers through a directory on disk
+figure_cache = FigureCache(maxsize=128, disk_path=os.environ.get('FIGURE_CACHE_DIR'))
 
 # Create a Dash app
 app = Dash(__name__, external_stylesheets=[
@@ -37,6 +181,31 @@ app = Dash(__name__, external_stylesheets=[
     'https://fonts.googleapis.com/css2?family=Roboto&display=swap'
 ])
 
+# Declare server for Heroku deployment. Needed for Procfile.
+server = app.server
+
+# Append-only ingest: POST {"readings": [["2022-06-01 13:00", -40.1], ...]} to
+# /api/readings/SHIR/WAT. Only enabled when INGEST_TOKEN is set; callers send it in the
+# X-Ingest-Token header. The cached series, its statistics and aggregates are extended
+# in place and its figures are rebuilt on the next view.
+INGEST_TOKEN = os.environ.get('INGEST_TOKEN')
+
+@server.route('/api/readings/<location>/<code>', methods=['POST'])
+def ingest_readings(location, code):
+    if not INGEST_TOKEN or request.headers.get('X-Ingest-Token') != INGEST_TOKEN:
+        abort(403)
+    if not SERIES_FILE.match(f"{location}21_{code}.csv"):
+        abort(404)
+    body = request.get_json(silent=True) or {}
+    readings = body.get('readings')
+    if not isinstance(readings, list) or not all(isinstance(r, (list, tuple)) and len(r) == 2 for r in readings):
+        abort(400)
+    try:
+        written = append_readings(series_cache, location, code, readings)
+    except (ValueError, TypeError) as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(appended=written)
+
 # Define the layout
 app.layout = html.Div(className="container-fluid", style={'font-family': 'Roboto'}, children=[
     html.Div(className="row", children=[
@@ -60,14 +229,61 @@ app.layout = html.Div(className="container-fluid", style={'font-family': 'Roboto
                         id='frequency',
                         options=[
                             {'label': 'All', 'value': 1},
-                            {'label': 'Every 2 days', 'value': 2},
-                            {'label': 'Every 3 days', 'value': 3},
-                            {'label': 'Every 5 days', 'value': 5}
+                            {'label': 'Every 2nd reading', 'value': 2},
+                            {'label': 'Every 3rd reading', 'value': 3},
+                            {'label': 'Every 5th reading', 'value': 5},
+                            {'label': 'Downsampled (LTTB)', 'value': 'lttb'},
+                            {'label': 'Downsampled (min/max envelope)', 'value': 'minmax'},
+                            {'label': 'Aggregated (auto resolution)', 'value': 'auto'}
                         ],
                         value=1,
                         labelStyle={'display': 'block'},
                         className="my-3"
                     ),
+                    html.P("Select renderer:", className="card-text"),
+                    dcc.RadioItems(
+                        id='renderer',
+                        options=[
+                            {'label': 'WebGL (fast)', 'value': 'webgl'},
+                            {'label': 'SVG', 'value': 'svg'}
+                        ],
+                        value='webgl',
+                        labelStyle={'display': 'block'},
+                        className="my-3"
+                    ),
+                    html.P("Select overlay:", className="card-text"),
+                    dcc.RadioItems(
+                        id='overlay',
+                        options=[
+                            {'label': 'None', 'value': 'none'},
+                            {'label': 'Rolling mean ±2σ', 'value': 'mean'},
+                            {'label': 'Rolling z-score', 'value': 'zscore'},
+                            {'label': 'Rolling correlation', 'value': 'corr'}
+                        ],
+                        value='none',
+                        labelStyle={'display': 'block'},
+                        className="my-3"
+                    ),
+                    dcc.Dropdown(id='overlay-window', clearable=False, value=30, className="my-3", options=[
+                        {'label': f'{days}-day window', 'value': days} for days in ROLLING_WINDOW_DAYS
+                    ]),
+                    dcc.Dropdown(id='overlay-series', clearable=False, className="my-3", style={'display': 'none'}),
+                    dcc.Checklist(
+                        id='anomaly-markers',
+                        options=[{'label': ' Mark anomalies', 'value': 'anomalies'},
+                                 {'label': ' Mark earthquakes', 'value': 'earthquakes'}],
+                        value=[],
+                        className="my-3"
+                    ),
+                    dcc.Dropdown(id='event-radius', clearable=False, value=100, className="my-3", options=[
+                        {'label': f'Earthquakes within {km} km', 'value': km} for km in EVENT_RADIUS_KM
+                    ]),
+                    dcc.Checklist(
+                        id='live-mode',
+                        options=[{'label': ' Live updates', 'value': 'live'}],
+                        value=[],
+                        className="my-3"
+                    ),
                     html.Button('Toggle Continuous/Yearly', id='graph-type', n_clicks=0, className="btn btn-primary"),
                 ])
             ])
@@ -78,7 +294,123 @@ app.layout = html.Div(className="container-fluid", style={'font-family': 'Roboto
                     html.H4("REGIONAL SURVEY FOR SEISMIC PROTECTION")
                 ]),
                 html.Div(className="card-body", children=[
-                    dcc.Graph(id='live-update-graph', config={'responsive': True}),
+                    dcc.Tabs(id='view-tabs', value='series', children=[
+                        dcc.Tab(label='Time series', value='series', children=[
+                            dcc.Graph(id='live-update-graph', config={'responsive': True}),
+                            dcc.Interval(id='live-interval', interval=LIVE_INTERVAL_MS, disabled=True),
+                            dcc.Store(id='live-cursor'),
+                        ]),
+                        dcc.Tab(label='Correlation matrix', value='correlation', children=[
+                            html.Div(className="row my-3", children=[
+                                html.Div(className="col-6", children=[
+                                    dcc.RadioItems(
+                                        id='correlation-analysis',
+                                        options=[
+                                            {'label': ' Underground water level', 'value': 'WAT'},
+                                            {'label': ' Radon gas', 'value': 'RAD'},
+                                            {'label': ' Magnetic field', 'value': 'MAG'}
+                                        ],
+                                        value='WAT',
+                                        inline=True,
+                                        labelStyle={'margin-right': '1em'}
+                                    ),
+                                ]),
+                                html.Div(className="col-3", children=[
+                                    dcc.Dropdown(id='correlation-year', clearable=False),
+                                ]),
+                            ]),
+                            dcc.Graph(id='correlation-graph', config={'responsive': True}),
+                        ]),
+                        dcc.Tab(label='Station comparison', value='comparison', children=[
+                            html.Div(className="row my-3", children=[
+                                html.Div(className="col-4", children=[
+                                    dcc.Dropdown(id='compare-first', clearable=False),
+                                ]),
+                                html.Div(className="col-4", children=[
+                                    dcc.Dropdown(id='compare-second', clearable=False),
+                                ]),
+                                html.Div(className="col-2", children=[
+                                    dcc.Dropdown(id='compare-year', clearable=False),
+                                ]),
+                                html.Div(className="col-2", children=[
+                                    dcc.Dropdown(id='compare-max-lag', clearable=False, value=3, options=[
+                                        {'label': f'±{days} days', 'value': days} for days in LAG_DAYS
+                                    ]),
+                                ]),
+                            ]),
+                            html.Div(id='compare-summary', className="my-2"),
+                            dcc.Graph(id='compare-graph', config={'responsive': True}),
+                        ]),
+                        dcc.Tab(label='Event stacking', value='epoch', children=[
+                            html.Div(className="row my-3", children=[
+                                html.Div(className="col-6", children=[
+                                    dcc.RadioItems(
+                                        id='epoch-scope',
+                                        options=[
+                                            {'label': ' Selected station', 'value': 'station'},
+                                            {'label': ' Every station of the analysis type', 'value': 'analysis'}
+                                        ],
+                                        value='station',
+                                        labelStyle={'margin-right': '1em'}
+                                    ),
+                                ]),
+                                html.Div(className="col-3", children=[
+                                    dcc.Dropdown(id='epoch-radius', clearable=False, value=100, options=[
+                                        {'label': f'Within {km} km', 'value': km} for km in EVENT_RADIUS_KM
+                                    ]),
+                                ]),
+                                html.Div(className="col-3", children=[
+                                    dcc.Dropdown(id='epoch-magnitude', clearable=False, value=4, options=[
+                                        {'label': f'Magnitude {m} and above', 'value': m} for m in EPOCH_MAGNITUDES
+                                    ]),
+                                ]),
+                            ]),
+                            html.Div(id='epoch-summary', className="my-2"),
+                            dcc.Graph(id='epoch-graph', config={'responsive': True}),
+                        ]),
+                        dcc.Tab(label='Anomaly alerts', value='anomalies', children=[
+                            html.P(id='anomaly-summary', className="my-3"),
+                            dash_table.DataTable(
+                                id='anomaly-table',
+                                columns=[
+                                    {'name': 'Station', 'id': 'station'},
+                                    {'name': 'Analysis', 'id': 'analysis'},
+                                    {'name': 'Time', 'id': 'time'},
+                                    {'name': 'Value', 'id': 'value'},
+                                    {'name': 'Seasonal median', 'id': 'baseline'},
+                                    {'name': 'z', 'id': 'z'}
+                                ],
+                                sort_action='native',
+                                page_size=25,
+                                style_cell={'font-family': 'Roboto', 'text-align': 'left'},
+                                style_data_conditional=[
+                                    {'if': {'filter_query': '{z} > 0'}, 'color': '#882225'},
+                                    {'if': {'filter_query': '{z} < 0'}, 'color': '#322288'}
+                                ]
+                            ),
+                            dcc.Interval(id='anomaly-interval', interval=ANOMALY_INTERVAL_MS),
+                        ]),
+                        dcc.Tab(label='Network status', value='status', children=[
+                            html.P(id='status-summary', className="my-3"),
+                            dash_table.DataTable(
+                                id='status-table',
+                                columns=[
+                                    {'name': 'Station', 'id': 'station'},
+                                    {'name': 'Analysis', 'id': 'analysis'},
+                                    {'name': 'Latest reading', 'id': 'time'},
+                                    {'name': 'Value', 'id': 'value'},
+                                    {'name': 'Hours behind', 'id': 'behind'}
+                                ],
+                                sort_action='native',
+                                page_size=50,
+                                style_cell={'font-family': 'Roboto', 'text-align': 'left'},
+                                style_data_conditional=[
+                                    {'if': {'filter_query': f'{{behind}} >= {STALE_HOURS}'}, 'color': '#882225', 'font-weight': 'bold'}
+                                ]
+                            ),
+                            dcc.Interval(id='status-interval', interval=STATUS_INTERVAL_MS),
+                        ]),
+                    ]),
                     html.Hr(),
                 ])
             ])
@@ -87,97 +419,88 @@ app.layout = html.Div(className="container-fluid", style={'font-family': 'Roboto
 ])
 
 
-parameter_file_extensions = {
-    "CA": "CA_",
-    "CL": "CL_",
-    "EH": "EH_",
-    "HCO": "HCO",
-    "HE": "HE_",
-    "K": "K__",
-    "MG": "MG_",
-    "NA": "NA_",
-    "NH4": "NH4",
-    "NO2": "NO2",
-    "NO3": "NO3",
-    "PH": "PH_",
-    "SO4": "SO4",
-    "NAK": "NAK",
-    "T": "T__",
-    "F": "F__",
+# Display names per analysis type, in dropdown order. The dropdowns only offer stations
+# the catalog has files for; stations missing here are listed under their code.
+station_labels = {
+    'RAD': {
+        'PARA': 'PARAKAR',
+        'AZAT': 'AZATAN',
+        'ARTK': 'ARTIK',
+        'BAVR': 'BAVRA',
+        'VANA': 'VANADZOR',
+        'KOXB': 'KOGHB',
+        'STEP': 'STEPANAVAN',
+        'SHIR': 'SHIRAKAMUT',
+        'GORS': 'GORIS',
+        'SISN': 'SISIAN',
+        'KADJ': 'KADJARAN',
+        'ARUC': 'ARUCH',
+        'JERM': 'JERMUK',
+        'NOEM': 'NOEMBERYAN',
+        'EKHG': 'EGHEGNADZOR',
+        'VARD': 'VARDENIS',
+        'KARC': 'KARCHAGHBYUR',
+        'METS': 'METSAMOR',
+        'STIP': 'STEPANAKERT',
+        'MARD': 'MARTAKERT',
+    },
+    'WAT': {
+        'ARTA': 'ARTASHAT',
+        'KARC': 'KARCHAKHPYUR',
+        'ASHO': 'ASHOTSK',
+        'IJEV': 'IJEVAN',
+        'NOEM': 'NOYEMBERYAN',
+        'SHIR': 'SHIRAKAMUT',
+        'GORS': 'GORIS',
+        'KUCH': 'KUCHAK',
+        'DZOR': 'DZORAKHBYUR',
+        'EKHG': 'EGHEGNADZOR',
+        'SEVN': 'SEVAN',
+        'METS': 'METSAMOR',
+        'AMAS': 'AMASIA',
+        'AZAT': 'AZATAN',
+    },
+    'MAG': {
+        'HOVT': 'HOVIT',
+        'ARUC': 'ARUCH',
+        'GARN': 'GARNI',
+        'EKHG': 'EGHEGNADZOR',
+        'KARC': 'KARCHAGHBYUR',
+        'BAVR': 'BAVRA',
+        'JERM': 'JERMUK',
+    },
+    'GEO': {
+        'ARAR': 'ARARAT',
+        'KARC': 'KARCHAGHBYUR',
+        'SURN': 'SURENAVAN',
+        'TSOV': 'TSOVAGYUGH',
+        'ACHU': 'AKHURIK',
+        'SART': 'SARATOVKA',
+        'KADJ': 'KADJARAN',
+        'STIP': 'STEPANAKERT',
+    },
 }
 
+# Parameter display names that differ from the parameter itself
+parameter_labels = {'HCO': 'HCO3'}
+
+# Cataloged stations of an analysis type, labelled ones first in their listed order
+def ordered_stations(analysis):
+    labels = station_labels.get(analysis, {})
+    stations = catalog.stations(analysis)
+    return [s for s in labels if s in stations] + sorted(s for s in stations if s not in labels)
+
 @app.callback(
     Output("location", "options"),
     Output("location", "value"),
     Input("analysis-type", "value")
 )
 def set_cities_options(selected_analysis):
-    locations = []
-    default_location = None
-
-    if selected_analysis == 'RAD':
-        locations = [
-            {'label': 'PARAKAR', 'value': 'PARA'},
-            {'label': 'AZATAN', 'value': 'AZAT'},
-            {'label': 'ARTIK', 'value': 'ARTK'},
-            {'label': 'BAVRA', 'value': 'BAVR'},
-            {'label': 'VANADZOR', 'value': 'VANA'},
-            {'label': 'KOGHB', 'value': 'KOXB'},
-            {'label': 'STEPANAVAN', 'value': 'STEP'},
-            {'label': 'SHIRAKAMUT', 'value': 'SHIR'},
-            {'label': 'GORIS', 'value': 'GORS'},
-            {'label': 'SISIAN', 'value': 'SISN'},
-            {'label': 'KADJARAN', 'value': 'KADJ'},
-            {'label': 'ARUCH', 'value': 'ARUC'},
-            {'label': 'JERMUK', 'value': 'JERM'},
-            {'label': 'NOEMBERYAN', 'value': 'NOEM'},
-            {'label': 'EGHEGNADZOR', 'value': 'EKHG'},
-            {'label': 'VARDENIS', 'value': 'VARD'},
-            {'label': 'KARCHAGHBYUR', 'value': 'KARC'},
-            {'label': 'METSAMOR', 'value': 'METS'},
-        ]
-        default_location = 'PARA'
-    elif selected_analysis == 'WAT':
-        locations = [
-            {"label": "ARTASHAT", "value": "ARTA"},
-            {"label": "KARCHAKHPYUR", "value": "KARC"},
-            {"label": "ASHOTSK", "value": "ASHO"},
-            {"label": "IJEVAN", "value": "IJEV"},
-            {"label": "NOYEMBERYAN", "value": "NOEM"},
-            {"label": "SHIRAKAMUT", "value": "SHIR"},
-            {"label": "GORIS", "value": "GORS"},
-            {"label": "KUCHAK", "value": "KUCH"},
-            {"label": "DZORAKHBYUR", "value": "DZOR"},
-            {"label": "EGHEGNADZOR", "value": "EKHG"},
-            {"label": "SEVAN", "value": "SEVN"},
-            {"label": "METSAMOR", "value": "METS"},
-            {"label": "AMASIA", "value": "AMAS"}
-        ]
-        default_location = 'ARTA'
-    elif selected_analysis == 'MAG':  # Add locations for Magnetic Field Analysis
-        locations = [
-            {"label": "HOVIT", "value": "HOVT"},
-            {"label": "ARUCH", "value": "ARUC"},
-            {"label": "GARNI", "value": "GARN"},
-            {"label": "EGHEGNADZOR", "value": "EKHG"},
-            {"label": "KARCHAGHBYUR", "value": "KARC"},
-            {"label": "BAVRA", "value": "BAVR"},
-            {"label": "JERMUK", "value": "JERM"},
-        ]
-        default_location = "HOVT"
-    elif selected_analysis == 'GEO':  # Add locations for Geochemical Analysis
-        locations = [
-            {"label": "ARARAT", "value": "ARAR"},
-            {"label": "KARCHAGHBYUR", "value": "KARC"},
-            {"label": "SURENAVAN", "value": "SURN"},
-            {"label": "TSOVAGYUGH", "value": "TSOV"},
-            {"label": "AKHURIK", "value": "ACHU"},
-            {"label": "SARATOVKA", "value": "SART"},  # Add "SARATOVKA SART" location
-            {"label": "KADJARAN", "value": "KADJ"},
-            {"label": "STEPANAKERT", "value": "STIP"},  # Add "STEPANAKERT STIP" location
-            # Add other locations for GEOCHEMICAL ANALYSIS here...
-        ]
-        default_location = "ARAR"
+    labels = station_labels.get(selected_analysis, {})
+    ordered = ordered_stations(selected_analysis)
+
+    locations = [{'label': labels.get(s, s), 'value': s} for s in ordered]
+    default_location = ordered[0] if ordered else None
 
     return locations, default_location
 
@@ -189,58 +512,9 @@ def set_cities_options(selected_analysis):
 )
 def set_parameters_options(selected_location, selected_analysis):
     if selected_analysis == 'GEO':
-        # Determine the available parameters based on the selected location
-        if selected_location in ['ACHU', 'SART']:
-            parameters = [
-                {"label": "CA", "value": "CA"},
-                {"label": "CL", "value": "CL"},
-                {"label": "MG", "value": "MG"},
-                {"label": "HCO3", "value": "HCO"},
-                {"label": "SO4", "value": "SO4"},
-                {"label": "NAK", "value": "NAK"},
-                {"label": "PH", "value": "PH"},
-                {"label": "T", "value": "T"},
-            ]
-        elif selected_location == 'KADJ':  # For KADJARAN
-            parameters = [
-                {"label": "CA", "value": "CA"},
-                {"label": "CL", "value": "CL"},
-                {"label": "HCO3", "value": "HCO"},
-                {"label": "MG", "value": "MG"},
-                {"label": "SO4", "value": "SO4"},
-                {"label": "PH", "value": "PH"},
-                {"label": "HE", "value": "HE"},
-            ]
-        elif selected_location == 'STIP':  # For STEAPANAKERT STIP
-            parameters = [
-                {"label": "CA", "value": "CA"},
-                {"label": "CL", "value": "CL"},
-                {"label": "F", "value": "F"},
-                {"label": "HCO3", "value": "HCO"},
-                {"label": "MG", "value": "MG"},
-                {"label": "NH4", "value": "NH4"},
-                {"label": "NO2", "value": "NO2"},
-                {"label": "NO3", "value": "NO3"},
-                {"label": "PH", "value": "PH"},
-                {"label": "SO4", "value": "SO4"},
-            ]
-        else:
-            # For other locations, include all the parameters
-            parameters = [
-                {"label": "CA", "value": "CA"},
-                {"label": "CL", "value": "CL"},
-                {"label": "EH", "value": "EH"},
-                {"label": "HCO3", "value": "HCO"},
-                {"label": "HE", "value": "HE"},
-                {"label": "K", "value": "K"},
-                {"label": "MG", "value": "MG"},
-                {"label": "NA", "value": "NA"},
-                {"label": "NH4", "value": "NH4"},
-                {"label": "NO2", "value": "NO2"},
-                {"label": "PH", "value": "PH"},
-                {"label": "SO4", "value": "SO4"},
-            ]
-        default_parameter = parameters[0]['value']  # Set the default parameter based on the selected location
+        # The parameters measured at the selected location, as found on disk
+        parameters = [{"label": parameter_labels.get(p, p), "value": p} for p in catalog.parameters(selected_location)]
+        default_parameter = parameters[0]['value'] if parameters else None
     else:
         parameters = []
         default_parameter = None
@@ -258,28 +532,518 @@ def toggle_parameter_dropdown(selected_analysis):
     else:
         return {'display': 'none'}, {'display': 'none'}
 
+@app.callback(
+    Output("correlation-year", "options"),
+    Output("correlation-year", "value"),
+    Input("correlation-analysis", "value")
+)
+def set_correlation_years(analysis):
+    years = sorted({year for location in catalog.stations(analysis)
+                    for year in catalog.years(location, catalog.code_for(analysis, location))})
+    options = [{'label': 'All years', 'value': 'all'}] + [{'label': str(2000 + yy), 'value': yy} for yy in years]
+    return options, years[-1] if years else 'all'
+
+# Heatmap of the correlation between every pair of stations of an analysis type, matched
+# hour by hour. Stations follow the dropdown order.
+@app.callback(Output('correlation-graph', 'figure'),
+              Input('correlation-analysis', 'value'),
+              Input('correlation-year', 'value'))
+def update_correlation_matrix(analysis, year):
+    matrix = correlation_engine.matrix(analysis, None if year == 'all' else year, ordered_stations(analysis))
+
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(),
+        x=list(matrix.columns),
+        y=list(matrix.index),
+        zmin=-1, zmax=1,
+        colorscale='RdBu', reversescale=True,
+        texttemplate='%{z:.2f}',
+        hovertemplate='%{y} / %{x}<br>r = %{z:.3f}<extra></extra>',
+        colorbar=dict(title='Correlation Coefficient')
+    ))
+    period = 'all years' if year == 'all' else str(2000 + year)
+    names = {'WAT': 'Underground Water Levels', 'RAD': 'Radon Levels', 'MAG': 'Magnetic Field'}
+    fig.update_layout(
+        autosize=False,
+        width=900,
+        height=800,
+        title={'text': f"Correlation Matrix of {names[analysis]} ({period})", 'x': 0.5, 'xanchor': 'center'},
+        xaxis=dict(side='top'),
+        yaxis=dict(autorange='reversed'),
+        margin=dict(l=50, r=50, t=120, b=50),
+        hoverlabel=dict(font=dict(family="Roboto", size=12))
+    )
+    return fig
+
+
+# Options for every hourly series, as "{location}_{code}" values, and the years they cover
+def comparable_series():
+    options, years = [], set()
+    for analysis in COMPARED_ANALYSES:
+        labels = station_labels.get(analysis, {})
+        for location in ordered_stations(analysis):
+            code = catalog.code_for(analysis, location)
+            options.append({'label': f"{labels.get(location, location)} ({analysis})", 'value': f"{location}_{code}"})
+            years.update(catalog.years(location, code))
+    return options, years
+
+# Options are refreshed whenever the comparison tab is opened, so stations and years the
+# catalog picked up since show up; the chosen series and year are kept while they are
+# still offered
+@app.callback(
+    Output("compare-first", "options"),
+    Output("compare-first", "value"),
+    Output("compare-second", "options"),
+    Output("compare-second", "value"),
+    Output("compare-year", "options"),
+    Output("compare-year", "value"),
+    Input("view-tabs", "value"),
+    State("compare-first", "value"),
+    State("compare-second", "value"),
+    State("compare-year", "value")
+)
+def set_comparison_options(tab, first=None, second=None, year=None):
+    if tab != 'comparison':
+        raise PreventUpdate
+    options, years = comparable_series()
+    year_options = [{'label': 'All years', 'value': 'all'}] + [{'label': str(2000 + yy), 'value': yy} for yy in sorted(years)]
+    offered = {o['value'] for o in options}
+    default_first = options[0]['value'] if options else None
+    default_second = next((o['value'] for o in options if o['value'].endswith('_RAD')), default_first)
+    return (options, no_update if first in offered else default_first,
+            options, no_update if second in offered else default_second,
+            year_options, no_update if year == 'all' or year in years else (max(years) if years else 'all'))
+
+# Two series matched by time: Pearson and Spearman correlation, both series, and their
+# correlation at every hourly lag up to the selected number of days either way (a peak at a
+# positive lag means the first series leads)
+@app.callback(Output('compare-summary', 'children'),
+              Output('compare-graph', 'figure'),
+              Input('compare-first', 'value'),
+              Input('compare-second', 'value'),
+              Input('compare-year', 'value'),
+              Input('compare-max-lag', 'value'),
+              Input('renderer', 'value'))
+def update_comparison(first, second, year, max_lag_days=3, renderer='webgl'):
+    if not first or not second:
+        raise PreventUpdate
+    first, second = tuple(first.split('_', 1)), tuple(second.split('_', 1))
+    result = comparison_service.compare(first, second, None if year == 'all' else year, int(max_lag_days) * 24)
+    names = [f"{location} {code.rstrip('_')}" for location, code in (first, second)]
+
+    fig = make_subplots(rows=2, cols=1, row_heights=[0.65, 0.35], vertical_spacing=0.12,
+                        specs=[[{'secondary_y': True}], [{}]],
+                        subplot_titles=("Matched readings", "Lagged cross-correlation"))
+    aligned = result.aligned
+    times = aligned['datetime'].to_numpy()
+    for column, name, color, secondary in (('a', names[0], '#117733', False), ('b', names[1], '#322288', True)):
+        kept = downsample(times, aligned[column].to_numpy(), 'lttb', PLOT_WIDTH)
+        fig.add_trace(line_trace(renderer, times[kept], aligned[column].to_numpy()[kept], times=times[kept],
+                                 mode='lines', name=name, line=dict(color=color, width=1)),
+                      row=1, col=1, secondary_y=secondary)
+    fig.add_trace(go.Scatter(x=result.lags / 24, y=result.lag_r, mode='lines', name='r at lag',
+                             line=dict(color='#882225', width=1),
+                             customdata=result.lags,
+                             hovertemplate='lag %{customdata} h<br>r = %{y:.3f}<extra></extra>'),
+                  row=2, col=1)
+    fig.update_xaxes(title_text="Date", type="date", row=1, col=1)
+    fig.update_xaxes(title_text=f"Lag of {names[1]} behind {names[0]} (days)", row=2, col=1)
+    fig.update_yaxes(title_text=names[0], row=1, col=1, secondary_y=False)
+    fig.update_yaxes(title_text=names[1], row=1, col=1, secondary_y=True)
+    fig.update_yaxes(title_text="r", range=[-1, 1], row=2, col=1)
+    fig.update_layout(
+        autosize=False,
+        width=PLOT_WIDTH,
+        height=800,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=50, r=50, t=90, b=50),
+        hoverlabel=dict(font=dict(family="Roboto", size=12))
+    )
+
+    if np.isfinite(result.lag_r).any():
+        best = int(np.nanargmax(np.abs(result.lag_r)))
+        peak = f", strongest at lag {result.lags[best]} h ({result.lags[best] / 24:.1f} days, r = {result.lag_r[best]:.3f})"
+    else:
+        peak = ""
+    summary = (f"{result.count} matched readings: Pearson r = {result.pearson:.3f}, "
+               f"Spearman ρ = {result.spearman:.3f}{peak}")
+    return summary, fig
+
+# The series the rolling correlation overlay pairs with, defaulting to another analysis at
+# the same station (e.g. SHIR RAD for SHIR WAT)
+@app.callback(
+    Output("overlay-series", "options"),
+    Output("overlay-series", "value"),
+    Output("overlay-series", "style"),
+    Input("location", "value"),
+    Input("analysis-type", "value"),
+    Input("overlay", "value")
+)
+def set_overlay_series(location, analysis, overlay):
+    if overlay != 'corr':
+        return no_update, no_update, {'display': 'none'}
+    options, _ = comparable_series()
+    own = f"{location}_{catalog.code_for(analysis, location)}"
+    others = [o for o in options if o['value'] != own]
+    default = next((o['value'] for o in others if o['value'].startswith(f"{location}_")),
+                   others[0]['value'] if others else None)
+    return others, default, {'display': 'block'}
+
+# Draw a rolling overlay of the station series. The mean and its ±2σ band share the value
+# axis; the z-score and correlation go on a second axis on the right.
+def add_overlay_traces(fig, location, code, overlay, window_days, other, continuous, renderer):
+    frame = rolling_statistics.overlay((location, code), overlay, window_days * 24, other)
+    if frame.empty:
+        return
+    if overlay == 'mean':
+        lines = [('mean', frame['mean'], f'{window_days}-day mean', 'solid'),
+                 ('upper', frame['mean'] + 2 * frame['std'], '+2σ', 'dot'),
+                 ('lower', frame['mean'] - 2 * frame['std'], '-2σ', 'dot')]
+        axis = 'y'
+    else:
+        column = frame[overlay]
+        label = f'{window_days}-day z-score' if overlay == 'zscore' else f"{window_days}-day r with {' '.join(other).rstrip('_')}"
+        lines = [(overlay, column, label, 'solid')]
+        axis = 'y2'
+        fig.update_layout(yaxis2=dict(title='z-score' if overlay == 'zscore' else 'r', overlaying='y', side='right',
+                                      showgrid=False, range=[-1, 1] if overlay == 'corr' else None))
+
+    times = frame.index.to_numpy()
+    years = times.astype('datetime64[Y]').astype(np.int64) + 1970
+    # One trace per year in the continuous view, where every year shares the Jan-Dec axis
+    groups = [(year, years == year) for year in np.unique(years)] if continuous else [(None, slice(None))]
+    for name, values, label, dash in lines:
+        for year, selected in groups:
+            x, y = times[selected], values.to_numpy()[selected]
+            kept = downsample(x, y, 'lttb', PLOT_WIDTH)
+            fig.add_trace(line_trace(
+                renderer,
+                month_day(x[kept]) if continuous else x[kept],
+                y[kept],
+                times=x[kept],
+                date_format=HOVER_DATE_CONTINUOUS if continuous else HOVER_DATE_YEARLY,
+                mode='lines',
+                name=label if year is None else f'{label} {year}',
+                legendgroup=name,
+                yaxis=axis,
+                line=dict(color='#999933', width=1, dash=dash)
+            ))
+
+# Superposed-epoch stack: the mean response of the selected series (or of every station of
+# its analysis type) from BEFORE_DAYS before to AFTER_DAYS after the nearby earthquakes,
+# with its 95% confidence band. Stacks over several stations are in standard deviations
+# from each window's pre-event mean, so stations with different levels can be combined.
+@app.callback(Output('epoch-summary', 'children'),
+              Output('epoch-graph', 'figure'),
+              Input('view-tabs', 'value'),
+              Input('analysis-type', 'value'),
+              Input('location', 'value'),
+              Input('geo-parameters', 'value'),
+              Input('epoch-scope', 'value'),
+              Input('epoch-radius', 'value'),
+              Input('epoch-magnitude', 'value'))
+def update_epoch_stack(tab, analysis, location, parameter, scope='station', radius_km=100, min_magnitude=4):
+    if tab != 'epoch' or not location:
+        raise PreventUpdate
+    if scope == 'analysis':
+        series = [(s, catalog.code_for(analysis, s, parameter)) for s in ordered_stations(analysis)]
+        name = f"{analysis} stations" if analysis != 'GEO' else f"{parameter} at GEO stations"
+    else:
+        series = [(location, catalog.code_for(analysis, location, parameter))]
+        name = f"{location} {series[0][1].rstrip('_')}"
+    normalize = scope == 'analysis'
+    result = epoch_stacker.stack(series, radius_km, min_magnitude, normalize=normalize)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=np.concatenate([result.offsets, result.offsets[::-1]]),
+        y=np.concatenate([result.upper, result.lower[::-1]]),
+        fill='toself',
+        fillcolor='rgba(51, 34, 136, 0.2)',
+        line=dict(width=0),
+        hoverinfo='skip',
+        name='95% interval'
+    ))
+    fig.add_trace(go.Scatter(
+        x=result.offsets,
+        y=result.mean,
+        mode='lines',
+        name=f'Mean of {name}',
+        line=dict(color='#322288', width=1),
+        customdata=result.count,
+        hovertemplate='%{x:.2f} days<br>%{y:.3f}<br>%{customdata} windows<extra></extra>'
+    ))
+    fig.add_vline(x=0, line=dict(color='red', dash='dash', width=1))
+    fig.update_layout(
+        autosize=False,
+        width=PLOT_WIDTH,
+        height=800,
+        xaxis=dict(title="Days relative to the earthquake", range=[-BEFORE_DAYS, AFTER_DAYS]),
+        yaxis=dict(title="Standard deviations from the pre-event mean" if normalize else name),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=50, r=50, t=90, b=50),
+        hoverlabel=dict(font=dict(family="Roboto", size=12))
+    )
+    stations = len({location for location, _ in series if location in STATION_COORDINATES})
+    summary = (f"{result.windows} event windows from {stations} station(s), earthquakes of magnitude "
+               f"{min_magnitude} and above within {radius_km} km.")
+    return summary, fig
+
+# Readings far from their station's seasonal (day of year x hour of day) median, over the
+# last LATEST_HOURS of every hourly series, largest excursion first
+@app.callback(Output('anomaly-table', 'data'),
+              Output('anomaly-summary', 'children'),
+              Input('view-tabs', 'value'),
+              Input('anomaly-interval', 'n_intervals'))
+def update_anomaly_table(tab, n_intervals):
+    if tab != 'anomalies':
+        raise PreventUpdate
+    flagged = anomaly_engine.scan()
+    labels = {analysis: station_labels.get(analysis, {}) for analysis in SERIES_ANALYSES}
+    rows = [{
+        'station': labels[code].get(location, location),
+        'analysis': code,
+        'time': pd.Timestamp(time).strftime('%Y-%m-%d %H:%M'),
+        'value': round(float(value), 3),
+        'baseline': round(float(baseline), 3),
+        'z': round(float(z), 1),
+    } for location, code, time, value, baseline, z in flagged.itertuples(index=False)]
+    stations = flagged[['location', 'code']].drop_duplicates()
+    summary = (f"{len(rows)} readings from {len(stations)} series lie more than {THRESHOLD:g} robust standard "
+               f"deviations from their seasonal median in the last {LATEST_HOURS} hours of data.")
+    return rows, summary
+
+# Latest reading of every WAT/RAD/MAG series and how far each lags the newest one
+@app.callback(Output('status-table', 'data'),
+              Output('status-summary', 'children'),
+              Input('view-tabs', 'value'),
+              Input('status-interval', 'n_intervals'))
+def update_status_table(tab, n_intervals):
+    if tab != 'status':
+        raise PreventUpdate
+    readings = latest_index.readings()
+    newest = max((r.datetime for r in readings if r.datetime is not None), default=None)
+    rows = []
+    for r in readings:
+        behind = int((newest - r.datetime) // np.timedelta64(1, 'h')) if r.datetime is not None else None
+        rows.append({
+            'station': station_labels.get(r.analysis, {}).get(r.location, r.location),
+            'analysis': r.analysis,
+            'time': pd.Timestamp(r.datetime).strftime('%Y-%m-%d %H:%M') if r.datetime is not None else '',
+            'value': None if np.isnan(r.value) else round(float(r.value), 3),
+            'behind': behind,
+        })
+    late = sum(1 for row in rows if row['behind'] is None or row['behind'] >= STALE_HOURS)
+    newest_text = pd.Timestamp(newest).strftime('%Y-%m-%d %H:%M') if newest is not None else 'none'
+    summary = f"{len(rows)} series, newest reading {newest_text}; {late} series {STALE_HOURS} or more hours behind."
+    return rows, summary
+
+# Mark the readings of a series that lie far from their seasonal median
+def add_anomaly_traces(fig, location, code, continuous, renderer):
+    flagged = anomaly_engine.flags(location, code)
+    if flagged.empty:
+        return
+    times = flagged['datetime'].to_numpy()
+    years = times.astype('datetime64[Y]').astype(np.int64) + 1970
+    groups = [(year, years == year) for year in np.unique(years)] if continuous else [(None, slice(None))]
+    for year, selected in groups:
+        x = times[selected]
+        fig.add_trace(line_trace(
+            renderer,
+            month_day(x) if continuous else x,
+            flagged['value'].to_numpy()[selected],
+            times=x,
+            date_format=HOVER_DATE_CONTINUOUS if continuous else HOVER_DATE_YEARLY,
+            hover_extra='<br>z = %{customdata:.1f}',
+            mode='markers',
+            name='Anomalies' if year is None else f'Anomalies {year}',
+            legendgroup='anomalies',
+            marker=dict(color='red', symbol='x', size=6),
+            customdata=flagged['z'].to_numpy()[selected]
+        ))
+
+# Vertical markers at the earthquakes within radius_km of the station inside the plotted
+# range. Each range is cut from the station's time-sorted events with two binary searches;
+# the continuous view looks up every year and places its events on the shared Jan-Dec axis.
+def add_event_traces(fig, location, radius_km, stats, continuous):
+    timeline = event_index.timeline(location, radius_km)
+    if not len(timeline) or not stats:
+        return
+    if continuous:
+        ranges = [(s.start, s.end) for s in stats.values()]
+    else:
+        ranges = [(min(s.start for s in stats.values()), max(s.end for s in stats.values()))]
+    events = pd.concat([timeline.between(start, end) for start, end in ranges])
+    if events.empty:
+        return
+
+    times = events['datetime'].to_numpy()
+    x = epoch_ms(month_day(times) if continuous else times).astype(np.float64)
+    # All lines in one trace, broken by NaN, on a hidden axis spanning the plot height
+    segments = np.stack([x, x, np.full(len(x), np.nan)], axis=1).ravel()
+    fig.add_trace(go.Scatter(
+        x=segments,
+        y=np.tile([0.0, 1.0, np.nan], len(x)),
+        mode='lines',
+        yaxis='y3',
+        name=f'Earthquakes within {radius_km} km',
+        legendgroup='earthquakes',
+        hoverinfo='skip',
+        line=dict(color='#aa4499', width=1, dash='dot')
+    ))
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=np.full(len(x), 0.97),
+        mode='markers',
+        yaxis='y3',
+        name='Earthquakes',
+        legendgroup='earthquakes',
+        showlegend=False,
+        text=pd.Series(times).dt.strftime('%Y-%m-%d %H:%M'),
+        customdata=np.stack([events['magnitude'].to_numpy(), events['distance_km'].to_numpy()], axis=1),
+        hovertemplate='%{text}<br>M %{customdata[0]:.1f}, %{customdata[1]:.0f} km away<extra></extra>',
+        marker=dict(color='#aa4499', symbol='triangle-down', size=np.clip(events['magnitude'].to_numpy() * 2, 4, 16))
+    ))
+    fig.update_layout(yaxis3=dict(overlaying='y', range=[0, 1], visible=False, fixedrange=True))
+
+# Plot each year from the coarsest pyramid level that still fills the plot, so the cost
+# stays constant however many years are shown. Hovering shows the bucket's min and max.
+def add_aggregate_traces(fig, location, code, series, stats, continuous, colors, trace_name, renderer):
+    pyramids = {year: series_cache.pyramid(location, code, year) for year in series}
+    if not pyramids:
+        return
+
+    starts = [p['hourly'].times[0] for p in pyramids.values() if len(p['hourly'].times)]
+    ends = [p['hourly'].times[-1] for p in pyramids.values() if len(p['hourly'].times)]
+    if continuous:
+        span_hours = 366 * 24  # Every year is drawn over the same Jan-Dec axis
+    else:
+        span_hours = int((max(ends) - min(starts)).astype(np.int64)) + 1 if starts else 0
+    level_name = pick_level(span_hours, PLOT_WIDTH)
+
+    for yy, pyramid in pyramids.items():
+        level = pyramid[level_name]
+        if not len(level.times):
+            continue
+        year = 2000 + yy
+        x = month_day(level.times) if continuous else level.times.astype('datetime64[ns]')
+        fig.add_trace(line_trace(
+            renderer,
+            x,
+            level.mean,
+            date_format=HOVER_DATE_CONTINUOUS if continuous else HOVER_DATE_YEARLY,
+            hover_extra='<br>min %{customdata[0]} / max %{customdata[1]}',
+            mode='lines',
+            name=trace_name(year),
+            line=dict(color=colors[(year - 2021) % len(colors)], width=1),
+            customdata=np.stack([level.min, level.max], axis=1)
+        ))
+
+        average_value = stats[year].mean
+        fig.add_shape(type="line",
+                      x0=x[0], y0=average_value,
+                      x1=x[-1] if continuous else max(s.end for s in stats.values()), y1=average_value,
+                      line=dict(color='red', dash="dash", width=1),
+                      name=f'Average for {trace_name(year)}'
+                      )
+
 @app.callback(Output('live-update-graph', 'figure'),
+              Output('live-cursor', 'data'),
               [Input('analysis-type', 'value'),
                Input('location', 'value'),
                Input('geo-parameters', 'value'),
                Input('frequency', 'value'),
-               Input('graph-type', 'n_clicks')])
+               Input('graph-type', 'n_clicks'),
+               Input('renderer', 'value'),
+               Input('overlay', 'value'),
+               Input('overlay-window', 'value'),
+               Input('overlay-series', 'value'),
+               Input('anomaly-markers', 'value'),
+               Input('event-radius', 'value')])
                
                
-def update_graph_live(analysis, location, parameter, frequency, n_clicks):
-    base_path = Path(__file__).parent / "data"  # Pointing to the "data" directory inside "src"
-    
-    if analysis == 'GEO':
-        file_extension = parameter_file_extensions[parameter]
-        file_names = [base_path / f"{location}{year}_{file_extension}.csv" for year in range(21, 31)]
-    else:
-        file_names = [base_path / f"{location}{year}_{analysis}.csv" for year in range(21, 31)]
+def update_graph_live(analysis, location, parameter, frequency, n_clicks, renderer='webgl',
+                      overlay='none', window_days=30, overlay_series=None, markers=(), event_radius=100):
+    code = catalog.code_for(analysis, location, parameter)
+    other = tuple(overlay_series.split('_', 1)) if overlay == 'corr' and overlay_series else None
+    if overlay == 'corr' and other is None:
+        overlay = 'none'
+    anomalies = 'anomalies' in (markers or []) and code in SERIES_ANALYSES
+    event_radius = event_radius if 'earthquakes' in (markers or []) and location in STATION_COORDINATES else None
 
-    # Only keep file names for files that actually exist
-    files = [file for file in file_names if os.path.isfile(file)]
+    # The figure only depends on the inputs and the files behind them
+    key = (analysis, location, parameter, frequency, n_clicks % 2, renderer, overlay, window_days, other, anomalies,
+           event_radius, series_cache.version(location, code), other and series_cache.version(*other),
+           event_radius and event_index.store.last_id())
+    figure = memoized_figure(figure_cache, key, build_figure, analysis, location, parameter, frequency, n_clicks,
+                             renderer, overlay, window_days, other, anomalies, event_radius)
+    return figure, live_cursor(figure, analysis, location, parameter, frequency, n_clicks, renderer,
+                               overlay, window_days, overlay_series, markers, event_radius)
 
-    # Load the updated data
-    dataframes = load_data(files)
+# What the live mode needs to extend a figure: the inputs it was built from, the newest
+# reading it shows and the index of each year's trace. Only the full-resolution views
+# without an overlay or markers can be extended; the others are rebuilt when new readings
+# arrive.
+def live_cursor(figure, analysis, location, parameter, frequency, n_clicks, renderer, overlay, window_days, overlay_series,
+                markers, event_radius=100):
+    code = catalog.code_for(analysis, location, parameter)
+    traces = {}
+    for index, trace in enumerate(figure.get('data', [])):
+        if 'meta' in trace:
+            traces[str(trace['meta'])] = index
+    return {
+        'inputs': [analysis, location, parameter, frequency, n_clicks, renderer, overlay, window_days, overlay_series,
+                   markers, event_radius],
+        'location': location,
+        'code': code,
+        'last': live_feed.latest(location, code)[1],
+        'extend': frequency == 1 and overlay == 'none' and not markers,
+        'traces': traces,
+    }
+
+@app.callback(Output('live-interval', 'disabled'),
+              Input('live-mode', 'value'))
+def toggle_live_mode(live_mode):
+    return 'live' not in (live_mode or [])
+
+# Push the readings appended since the client's last point through extendData, so a tick
+# sends the new points only. Years the figure has no trace for yet, and the downsampled or
+# aggregated views, get a full figure instead.
+@app.callback(Output('live-update-graph', 'extendData'),
+              Output('live-update-graph', 'figure', allow_duplicate=True),
+              Output('live-cursor', 'data', allow_duplicate=True),
+              Input('live-interval', 'n_intervals'),
+              State('live-cursor', 'data'),
+              prevent_initial_call=True)
+def push_live_points(n_intervals, cursor):
+    if not cursor or not cursor['location']:
+        raise PreventUpdate
+    new, last = live_feed.since(cursor['location'], cursor['code'], cursor['last'])
+    if not new:
+        raise PreventUpdate
+
+    if not cursor['extend'] or any(str(2000 + yy) not in cursor['traces'] for yy in new):
+        figure, new_cursor = update_graph_live(*cursor['inputs'])
+        return no_update, figure, new_cursor
+
+    analysis, location, parameter, frequency, n_clicks, renderer = cursor['inputs'][:6]
+    continuous = n_clicks % 2 == 0
+    update, indices = {}, []
+    for yy, data in new.items():
+        times = data.times.astype('datetime64[ns]')
+        points = trace_points(renderer, data.month_day if continuous else times, as_float64(data.values), times)
+        for name, values in points.items():
+            update.setdefault(name, []).append(values)
+        indices.append(cursor['traces'][str(2000 + yy)])
+    return [update, indices], no_update, dict(cursor, last=last)
+
+def build_figure(analysis, location, parameter, frequency, n_clicks, renderer='webgl', overlay='none', window_days=30, other=None,
+                 anomalies=False, event_radius=None):
+    code = catalog.code_for(analysis, location, parameter)
+
+    # Load the parsed series for every year that has a file
+    series = series_cache.get_years(location, code)
+    stats = station_stats(location, code, series)
 
     # Create a Plotly figure
     fig = go.Figure()
@@ -288,63 +1052,82 @@ def update_graph_live(analysis, location, parameter, frequency, n_clicks):
     colors_continuous = ['#117733', '#322288', '#882225']
     colors_yearly = ['#117733', '#322288', '#882225']
 
-    if n_clicks % 2 == 0:  # Continuous View
+    if frequency == 'auto':  # Aggregated view from the resolution pyramid
+        add_aggregate_traces(fig, location, code, series, stats, n_clicks % 2 == 0,
+                             colors_continuous if n_clicks % 2 == 0 else colors_yearly,
+                             lambda year: f'{location} {parameter} {year} ANALYSIS' if analysis == 'GEO' else f'{location} {year}',
+                             renderer)
+    elif n_clicks % 2 == 0:  # Continuous View
+        dataframes = {i: series_frame(data) for i, data in enumerate(series.values())}
         for i, df in dataframes.items():
-            df = df.iloc[::frequency, :]
+            df = stride(df, frequency)
             for year, group in df.groupby('year'):
                 color_index = (year - 2021) % len(colors_continuous)  # Calculate the color index based on the year
-                fig.add_trace(go.Scatter(
-                    x=group['month_day'],
-                    y=group['value'],
+                points = reduce_trace(group, frequency, 'month_day')
+                fig.add_trace(line_trace(
+                    renderer,
+                    points['month_day'],
+                    points['value'],
+                    times=points['datetime'],
+                    date_format=HOVER_DATE_CONTINUOUS,
                     mode='lines',
                     name=f'{location} {parameter} {year} ANALYSIS' if analysis == 'GEO' else f'{location} {year}',  # Modified graph title
                     line=dict(color=colors_continuous[color_index], width=1),  # Assign color to each line
-                    hovertemplate='%{x}<br>%{y}<br>%{text}',
-                    text=group['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+                    meta=int(year)  # Lets live mode find the trace of a year
                 ))
 
-                average_value = group['value'].mean()
-                x1 = df['month_day'].max()  # Use the maximum date as the end point
+                average_value = stats[year].mean
+                x1 = stats[year].last_day  # Use the maximum date as the end point
 
                 fig.add_shape(type="line",
-                              x0=group['month_day'].min(), y0=average_value,
+                              x0=stats[year].first_day, y0=average_value,
                               x1=x1, y1=average_value,
                               line=dict(color='red', dash="dash", width=1),
                               name=f'Average for {location} {parameter} {year} ANALYSIS' if analysis == 'GEO' else f'Average for {location} {year}'  # Modified average line label
                               )
     else:  # Yearly View
-        df_concat = pd.concat(dataframes.values()).sort_values(by='datetime')
-        df_concat = df_concat.iloc[::frequency, :]
+        # Each year file is already in time order, so the years only need concatenating
+        df_concat = merge_years([series_frame(data) for data in series.values()])
+        df_concat = stride(df_concat, frequency)
+        x1 = max((s.end for s in stats.values()), default=None)  # Use the maximum date as the end point
 
-        for i, year in enumerate(df_concat['year'].unique()):
+        for year, year_data in df_concat.groupby('year', sort=True):
             color_index = (year - 2021) % len(colors_yearly)  # Calculate the color index based on the year
-            year_data = df_concat[df_concat['year'] == year]
-            fig.add_trace(go.Scatter(
-                x=year_data['datetime'],
-                y=year_data['value'],
+            points = reduce_trace(year_data, frequency, 'datetime')
+            fig.add_trace(line_trace(
+                renderer,
+                points['datetime'],
+                points['value'],
+                times=points['datetime'],
+                date_format=HOVER_DATE_YEARLY,
                 mode='lines',
                 name=f'{location} {parameter} {year} ANALYSIS' if analysis == 'GEO' else f'{location} {year}',  # Modified graph title
                 line=dict(color=colors_yearly[color_index], width=1),  # Assign color to each line
-                hovertemplate='%{x}<br>%{y}<br>%{text}',
-                text=year_data['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+                meta=int(year)  # Lets live mode find the trace of a year
             ))
 
-            average_value = year_data['value'].mean()
-            x1 = df_concat['datetime'].max()  # Use the maximum date as the end point
+            average_value = stats[year].mean
 
             fig.add_shape(type="line",
-                          x0=year_data['datetime'].min(), y0=average_value,
+                          x0=stats[year].start, y0=average_value,
                           x1=x1, y1=average_value,
                           line=dict(color='red', dash="dash", width=1),
                           name=f'Average for {location} {parameter} {year} ANALYSIS' if analysis == 'GEO' else f'Average for {location} {year}'  # Modified average line label
                           )
 
+    if overlay != 'none':
+        add_overlay_traces(fig, location, code, overlay, window_days, other, n_clicks % 2 == 0, renderer)
+    if anomalies:
+        add_anomaly_traces(fig, location, code, n_clicks % 2 == 0, renderer)
+    if event_radius:
+        add_event_traces(fig, location, event_radius, stats, n_clicks % 2 == 0)
+
     fig.update_layout(
         autosize=False,
-        width=1200,
+        width=PLOT_WIDTH,
         height=800,
         title={"text": f"{location.upper()} {parameter} ANALYSIS" if analysis == 'GEO' else f"{location.upper()} {analysis} ANALYSIS", 'x': 0.5, 'xanchor': 'center'},
-        xaxis=dict(title="Date", tickformat="%m-%d"),  # Show months and days
+        xaxis=dict(title="Date", type="date", tickformat="%m-%d"),  # Show months and days
         yaxis=dict(title="H/m" if analysis == 'WAT' else "C,imp/min" if analysis == 'RAD' else "E-2mg-e/l" if analysis == 'GEO' else "n/Tl" if analysis == 'MAG' else "Value"),  # Update the y-axis title based on the analysis type
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
         margin=dict(l=50, r=50, t=90, b=50),
@@ -0,0 +1,185 @@
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+# {location}{yy}_{code}.csv, e.g. SHIR22_WAT.csv or ARAR21_CA_.csv
+SERIES_FILE = re.compile(r'^([A-Z]{4})(\d{2})_([A-Z0-9_]{3})\.csv$')
+
+# Analysis types whose file code is the analysis itself; every other code is a
+# geochemical parameter
+SERIES_ANALYSES = ('WAT', 'RAD', 'MAG')
+
+# Geochemical parameter -> file code
+parameter_file_extensions = {
+    "CA": "CA_",
+    "CL": "CL_",
+    "EH": "EH_",
+    "HCO": "HCO",
+    "HE": "HE_",
+    "K": "K__",
+    "MG": "MG_",
+    "NA": "NA_",
+    "NH4": "NH4",
+    "NO2": "NO2",
+    "NO3": "NO3",
+    "PH": "PH_",
+    "SO4": "SO4",
+    "NAK": "NAK",
+    "T": "T__",
+    "F": "F__",
+}
+file_extension_parameters = {code: parameter for parameter, code in parameter_file_extensions.items()}
+
+# Seconds between re-scans of the data directory by the watcher
+WATCH_INTERVAL = 5.0
+
+# One station file. stamp is (mtime_ns, size) as of the last scan.
+CatalogEntry = namedtuple('CatalogEntry', ['location', 'analysis', 'parameter', 'code', 'year', 'path', 'stamp'])
+
+
+# File code for an analysis type (and parameter, for GEO)
+def file_code(analysis, parameter=None):
+    if analysis == 'GEO':
+        return parameter_file_extensions.get(parameter, parameter)
+    return analysis
+
+# (analysis, parameter) for a file code; codes nobody listed yet are treated as new
+# geochemical parameters named after the code
+def classify_code(code):
+    if code in SERIES_ANALYSES:
+        return code, None
+    return 'GEO', file_extension_parameters.get(code, code.rstrip('_'))
+
+# Build the catalog with a single directory scan
+def scan(data_path):
+    entries = {}
+    with os.scandir(data_path) as it:
+        for item in it:
+            match = SERIES_FILE.match(item.name)
+            if not match or not item.is_file():
+                continue
+            location, yy, code = match.groups()
+            analysis, parameter = classify_code(code)
+            st = item.stat()
+            entry = CatalogEntry(location, analysis, parameter, code, int(yy), item.path,
+                                 (st.st_mtime_ns, st.st_size))
+            entries[(location, code, int(yy))] = entry
+    return entries
+
+
+# Nested lookup built from the scan: analysis -> location -> parameter -> (code, years).
+# parameter is None for the WAT/RAD/MAG analyses.
+def build_index(entries):
+    index = {}
+    for entry in entries.values():
+        stations = index.setdefault(entry.analysis, {})
+        parameters = stations.setdefault(entry.location, {})
+        code, years = parameters.get(entry.parameter, (entry.code, []))
+        parameters[entry.parameter] = (code, sorted(years + [entry.year]))
+    return index
+
+
+class Catalog:
+    # Index of every station file under data_path, built by one directory scan and kept
+    # current by a watcher thread. Requests answer from memory without touching the
+    # filesystem.
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self._watching = False
+        self.refresh()
+
+    def refresh(self):
+        entries = scan(self.data_path)
+        changed = entries != getattr(self, 'entries', None)
+        if changed:
+            # Swap both at once; readers never see a half-built index
+            self.entries, self.index = entries, build_index(entries)
+        return changed
+
+    # Re-stat one file written by this process (e.g. an append) without waiting for the
+    # watcher's next scan
+    def touch(self, path):
+        match = SERIES_FILE.match(os.path.basename(path))
+        if not match:
+            return None
+        location, yy, code = match.groups()
+        analysis, parameter = classify_code(code)
+        st = os.stat(path)
+        entry = CatalogEntry(location, analysis, parameter, code, int(yy), str(path), (st.st_mtime_ns, st.st_size))
+        entries = dict(self.entries)
+        entries[(location, code, int(yy))] = entry
+        self.entries, self.index = entries, build_index(entries)
+        return entry
+
+    def __iter__(self):
+        return iter(list(self.entries.values()))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, location, code, year):
+        return self.entries.get((location, code, year))
+
+    def stations(self, analysis):
+        return list(self.index.get(analysis, {}))
+
+    # Geochemical parameters of a station, listed parameters first in their usual order
+    def parameters(self, location, analysis='GEO'):
+        found = [p for p in self.index.get(analysis, {}).get(location, {}) if p is not None]
+        order = list(parameter_file_extensions)
+        return sorted(found, key=lambda p: (order.index(p) if p in order else len(order), p))
+
+    def code_for(self, analysis, location, parameter=None):
+        found = self.index.get(analysis, {}).get(location, {}).get(parameter if analysis == 'GEO' else None)
+        return found[0] if found else file_code(analysis, parameter)
+
+    def years(self, location, code):
+        analysis, parameter = classify_code(code)
+        found = self.index.get(analysis, {}).get(location, {}).get(parameter)
+        return list(found[1]) if found and found[0] == code else []
+
+    # (year, mtime_ns, size) of every year file of a series as of the last scan
+    def version(self, location, code):
+        stamps = []
+        for year in self.years(location, code):
+            entry = self.entries.get((location, code, year))
+            if entry is not None:
+                stamps.append((year,) + entry.stamp)
+        return tuple(stamps)
+
+    # Re-scan every `interval` seconds so new or replaced files show up without a restart.
+    # The thread is restarted in every forked gunicorn worker.
+    def start_watcher(self, interval=WATCH_INTERVAL):
+        self.interval = interval
+        if not self._watching:
+            self._watching = True
+            os.register_at_fork(after_in_child=self._spawn_watcher)
+            self._spawn_watcher()
+
+    def _spawn_watcher(self):
+        threading.Thread(target=self._watch, name='catalog-watcher', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except OSError as e:
+                print(f"Error while scanning {self.data_path}: {e}")
+
+# Parse every cataloged series (and its per-year statistics and aggregates) into the cache.
+# Run before gunicorn forks (--preload) so the workers share the parsed pages
+# copy-on-write and the first request is as fast as any other.
+def preload(catalog, cache, derive=()):
+    stations = {}
+    for entry in catalog:
+        stations.setdefault((entry.location, entry.code), []).append(entry.year)
+    for (location, code), years in sorted(stations.items()):
+        series = cache.get_years(location, code, sorted(years))
+        for build in derive:
+            build(location, code, series)
+    cache.shutdown()
+    return len(stations)
@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from correlation import MIN_PERIODS, align_hourly, station_readings
+from cross_correlation import cross_correlation
+from figure_cache import VersionedCache
+
+# Readings of the second series are paired with the nearest reading of the first within
+# this distance; anything further apart is left unpaired
+MATCH_TOLERANCE = pd.Timedelta(minutes=30)
+
+# Default lag range of the cross-correlation, in hours either way
+MAX_LAG_HOURS = 72
+
+# aligned is a frame of datetime, a, b with one row per matched pair of readings; lag_r[i]
+# is the correlation of a at t with b at t + lags[i] hours
+Comparison = namedtuple('Comparison', ['aligned', 'pearson', 'spearman', 'count', 'lags', 'lag_r'])
+
+# Everything about a pair that does not depend on the lag range: the matched readings and
+# their statistics, and both series on one hourly index for the lag scan
+Alignment = namedtuple('Alignment', ['aligned', 'pearson', 'spearman', 'count', 'hourly'])
+
+
+# Pair the readings of two series by time with merge_asof instead of by row position.
+# a and b are (times, values); readings without a value are dropped before matching.
+def align_pair(a, b, tolerance=MATCH_TOLERANCE):
+    frames = []
+    for name, (times, values) in (('a', a), ('b', b)):
+        df = pd.DataFrame({'datetime': np.asarray(times).astype('datetime64[ns]'), name: np.asarray(values, dtype=np.float64)})
+        df = df.dropna(subset=[name])
+        if not df['datetime'].is_monotonic_increasing:
+            df = df.sort_values('datetime', kind='stable')
+        frames.append(df)
+    aligned = pd.merge_asof(frames[0], frames[1], on='datetime', direction='nearest', tolerance=tolerance)
+    return aligned.dropna(subset=['b']).reset_index(drop=True)
+
+# Align two series given as (times, values) and correlate the matched readings
+def align(a, b, tolerance=MATCH_TOLERANCE):
+    aligned = align_pair(a, b, tolerance)
+    pair = aligned[['a', 'b']]
+    enough = len(pair) >= MIN_PERIODS
+    pearson = pair['a'].corr(pair['b']) if enough else np.nan
+    # Spearman is Pearson on the ranks
+    ranks = pair.rank()
+    spearman = ranks['a'].corr(ranks['b']) if enough else np.nan
+    return Alignment(aligned, pearson, spearman, len(pair), align_hourly({'a': a, 'b': b}))
+
+# The comparison of an aligned pair with its correlation at every lag up to max_lag_hours
+def lag_scan(alignment, max_lag_hours=MAX_LAG_HOURS):
+    hourly = alignment.hourly
+    lags, lag_r = cross_correlation(hourly['a'].to_numpy(), hourly['b'].to_numpy(), max_lag_hours)
+    return Comparison(alignment.aligned, alignment.pearson, alignment.spearman, alignment.count, lags, lag_r)
+
+# Everything the comparison view shows for two series given as (times, values)
+def compare(a, b, max_lag_hours=MAX_LAG_HOURS, tolerance=MATCH_TOLERANCE):
+    return lag_scan(align(a, b, tolerance), max_lag_hours)
+
+
+class ComparisonService:
+    # Comparisons of two station series, kept per worker and recomputed only when one of
+    # their files changes. The alignment of a pair is kept apart from its lag scans, so
+    # choosing another lag range only redoes the FFT. Series are (location, code) pairs.
+
+    def __init__(self, cache, maxsize=32):
+        self.cache = cache
+        self._alignments = VersionedCache(maxsize)
+        self._results = VersionedCache(maxsize)
+
+    # year is two-digit, or None for every cataloged year
+    def compare(self, first, second, year=None, max_lag_hours=MAX_LAG_HOURS):
+        years = None if year is None else [year]
+        version = (self.cache.version(*first, years), self.cache.version(*second, years))
+        pair = (first, second, year)
+
+        def build():
+            alignment = self._alignments.get(pair, version, lambda: align(
+                station_readings(self.cache, *first, years), station_readings(self.cache, *second, years)))
+            return lag_scan(alignment, max_lag_hours)
+        return self._results.get(pair + (max_lag_hours,), version, build)
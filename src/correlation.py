@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from figure_cache import VersionedCache
+
+# Pairs with fewer overlapping hours than this get NaN rather than a meaningless r
+MIN_PERIODS = 24
+
+
+# Readings of a station series over the given years (every cataloged year by default),
+# as datetime64[h] times and float64 values
+def station_readings(cache, location, code, years=None):
+    series = cache.get_years(location, code, years)
+    if not series:
+        return np.array([], dtype='datetime64[h]'), np.array([], dtype=np.float64)
+    times = np.concatenate([np.asarray(data.times).astype('datetime64[h]') for data in series.values()])
+    values = np.concatenate([np.asarray(data.values, dtype=np.float64) for data in series.values()])
+    return times, values
+
+# Place every series on one shared hourly index: a frame with one column per series and
+# NaN where a station has no reading for the hour. Each series is written with a single
+# fancy-indexed assignment, so stations are matched by timestamp rather than row position
+# (MAG files start at 06:00 and have gaps). series is {name: (times, values)}.
+def align_hourly(series):
+    hours = {name: np.asarray(times).astype('datetime64[h]').astype(np.int64) for name, (times, _) in series.items()}
+    present = [h for h in hours.values() if len(h)]
+    if not present:
+        return pd.DataFrame(columns=list(series), dtype=np.float64)
+    start = min(h.min() for h in present)
+    end = max(h.max() for h in present)
+
+    matrix = np.full((end - start + 1, len(series)), np.nan)
+    for column, (name, (_, values)) in enumerate(series.items()):
+        # Repeated hours keep the last reading
+        matrix[hours[name] - start, column] = values
+    index = pd.DatetimeIndex(np.arange(start, end + 1).astype('datetime64[h]'), name='datetime')
+    return pd.DataFrame(matrix, index=index, columns=list(series))
+
+# Pearson correlation of every pair of series in one DataFrame.corr call, each pair over
+# the hours both have a reading for
+def correlation_matrix(series, min_periods=MIN_PERIODS):
+    return align_hourly(series).corr(min_periods=min_periods)
+
+
+class CorrelationEngine:
+    # Correlation matrices of every station of an analysis type, kept per worker and
+    # recomputed only when one of the station files changes
+
+    def __init__(self, cache, catalog, maxsize=32):
+        self.cache = cache
+        self.catalog = catalog
+        self._results = VersionedCache(maxsize)
+
+    # Matrix over the stations of `analysis` (station codes as labels), for one year
+    # (two-digit) or every cataloged year
+    def matrix(self, analysis, year=None, stations=None):
+        stations = stations or sorted(self.catalog.stations(analysis))
+        codes = {location: self.catalog.code_for(analysis, location) for location in stations}
+        years = None if year is None else [year]
+        version = tuple(self.cache.version(location, code, years) for location, code in codes.items())
+
+        def build():
+            return correlation_matrix({location: station_readings(self.cache, location, code, years)
+                                       for location, code in codes.items()})
+        return self._results.get((analysis, year, tuple(stations)), version, build)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from correlation import MIN_PERIODS
+
+
+# Smallest power of two holding a linear (not circular) correlation of two n-long arrays
+def fft_length(n):
+    return 1 << int(2 * n - 1).bit_length()
+
+# c[k] = sum over t of x[t] * y[t + k] for k = -max_lag ... max_lag, via the spectra of x
+# and y (X, Y) of length `size`
+def lag_sums(X, Y, size, max_lag):
+    c = np.fft.irfft(np.conj(X) * Y, size)
+    return np.concatenate([c[size - max_lag:], c[:max_lag + 1]])
+
+# Pearson correlation of a at t with b at t + k for every lag k up to max_lag either way,
+# each over the hours where both have a reading. a and b are hourly arrays of the same
+# length with NaN gaps. Every windowed sum the coefficient needs (counts, sums, sums of
+# squares and cross products) is one FFT correlation, so the whole scan is O(n log n)
+# instead of O(n * lags).
+def cross_correlation(a, b, max_lag, min_periods=MIN_PERIODS):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    n = len(a)
+    max_lag = min(max_lag, max(n - 1, 0))
+    lags = np.arange(-max_lag, max_lag + 1)
+    if n == 0:
+        return lags, np.full(len(lags), np.nan)
+
+    has_a, has_b = ~np.isnan(a), ~np.isnan(b)
+    # Centering first keeps the sums small, so the differences below do not cancel
+    a = np.where(has_a, a - (a[has_a].mean() if has_a.any() else 0.0), 0.0)
+    b = np.where(has_b, b - (b[has_b].mean() if has_b.any() else 0.0), 0.0)
+
+    size = fft_length(n)
+    spectrum = lambda x: np.fft.rfft(x, size)
+    A, A2, MA = spectrum(a), spectrum(a * a), spectrum(has_a.astype(np.float64))
+    B, B2, MB = spectrum(b), spectrum(b * b), spectrum(has_b.astype(np.float64))
+
+    count = np.rint(lag_sums(MA, MB, size, max_lag))
+    sum_a, sum_b = lag_sums(A, MB, size, max_lag), lag_sums(MA, B, size, max_lag)
+    sum_aa, sum_bb = lag_sums(A2, MB, size, max_lag), lag_sums(MA, B2, size, max_lag)
+    sum_ab = lag_sums(A, B, size, max_lag)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = count * sum_ab - sum_a * sum_b
+        variance = (count * sum_aa - sum_a ** 2) * (count * sum_bb - sum_b ** 2)
+        r = covariance / np.sqrt(variance)
+    r[(count < min_periods) | ~(variance > 0)] = np.nan
+    return lags, np.clip(r, -1.0, 1.0)
@@ -6,20 +6,9 @@ from datetime import datetime
 import traceback
 import pdfkit
 
-# Load your data
-def load_data(files):
-    dataframes = {}
-    for i, file in enumerate(files):
-        df = pd.read_csv(file)
-        try:
-            df['date'] = pd.to_datetime(df['date'])
-            df['datetime'] = pd.to_datetime(df['date'].dt.date.astype(str) + ' ' + df['hour'])
-            df['month_day'] = df['datetime'].apply(lambda x: x.replace(year=2000))
-            df['year'] = df['datetime'].dt.year
-        except Exception as e:
-            print(f"Error while processing file {file}: {e}")
-        dataframes[i] = df
-    return dataframes
+# Share the vectorized loader with src/app.py
+import src_path
+from loader import load_data
 
 # Create a Dash app
 app = Dash(__name__, external_stylesheets=['https://stackpath.bootstrapcdn.com/bootstrap/4.5.0/css/bootstrap.min.css'])
@@ -4,6 +4,11 @@ from dash.dependencies import Input, Output
 import pandas as pd
 import plotly.graph_objs as go
 
+# Share the loader and the comparison service with src/app.py
+import src_path
+import comparison
+from loader import read_frame
+
 # Define directory path
 DATA_DIR = "/Users/tsoghikpetrosyan/Desktop/myflaskapp/"
 
@@ -115,19 +120,19 @@ app.layout = html.Div([
 )
 def update_output(n_clicks, wat_value_1, station_value_2):
     # Load the selected datasets from the specified directory
-    wat_data_1 = pd.read_csv(f'{DATA_DIR}{wat_value_1}23_WAT.CSV')
+    wat_data_1 = read_frame(f'{DATA_DIR}{wat_value_1}23_WAT.CSV')
     
     # Determine if the second dataset is WAT or RAD
     station_type_2 = station_value_2.split('_')[1]
     station_name_2 = station_value_2.split('_')[0]
     
     if station_type_2 == "WAT":
-        data_2 = pd.read_csv(f'{DATA_DIR}{station_name_2}23_WAT.CSV')
+        data_2 = read_frame(f'{DATA_DIR}{station_name_2}23_WAT.CSV')
     else:  # RAD
-        data_2 = pd.read_csv(f'{DATA_DIR}{station_name_2}23_RAD.CSV')
+        data_2 = read_frame(f'{DATA_DIR}{station_name_2}23_RAD.CSV')
     
-    # Calculate correlation
-    correlation_value = wat_data_1['value'].corr(data_2['value'])
+    # Calculate correlation, pairing the readings by time rather than by row position
+    correlation_value = comparison.compare((wat_data_1['datetime'], wat_data_1['value']), (data_2['datetime'], data_2['value'])).pearson
 
     # Generate the graph
     trace1 = go.Scatter(x=wat_data_1['date'], y=wat_data_1['value'], mode='lines', name=f'{wat_value_1}23.WAT')
@@ -5,6 +5,11 @@ import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.graph_objs as go
 
+# Share the loader and the comparison service with src/app.py
+import src_path
+import comparison
+from loader import read_frame
+
 
 
 
@@ -138,31 +143,31 @@ def update_output(n_clicks, wat_value, wat2_value, rad_value, mag_value):
 
     # Load the selected datasets based on dropdown values
     if wat_value != 'None':
-        data_1 = pd.read_csv(f'{DATA_DIR}{wat_value}.csv')
+        data_1 = read_frame(f'{DATA_DIR}{wat_value}.csv')
         data1_type = wat_value.split('_')[0]
     elif rad_value != 'None':
-        data_1 = pd.read_csv(f'{DATA_DIR}{rad_value}.csv')
+        data_1 = read_frame(f'{DATA_DIR}{rad_value}.csv')
         data1_type = rad_value.split('_')[0]
     elif mag_value != 'None':
-        data_1 = pd.read_csv(f'{DATA_DIR}{mag_value}.csv')
+        data_1 = read_frame(f'{DATA_DIR}{mag_value}.csv')
         data1_type = mag_value.split('_')[0]
     else:
         return "Please select at least one parameter.", dash.no_update
 # Determine the second dataset for correlation
     if wat2_value != 'None':
-        data_2 = pd.read_csv(f'{DATA_DIR}{wat2_value}.csv')
+        data_2 = read_frame(f'{DATA_DIR}{wat2_value}.csv')
         data2_type = wat2_value.split('_')[0]
     elif rad_value != 'None' and data1_type != rad_value.split('_')[0]:
-        data_2 = pd.read_csv(f'{DATA_DIR}{rad_value}.csv')
+        data_2 = read_frame(f'{DATA_DIR}{rad_value}.csv')
         data2_type = rad_value.split('_')[0]
     elif mag_value != 'None' and data1_type != mag_value.split('_')[0]:
-        data_2 = pd.read_csv(f'{DATA_DIR}{mag_value}.csv')
+        data_2 = read_frame(f'{DATA_DIR}{mag_value}.csv')
         data2_type = mag_value.split('_')[0]
     else:
         return "Please select two different parameters to correlate.", dash.no_update
 
-    # Calculate correlation
-    correlation_value = data_1['value'].corr(data_2['value'])
+    # Calculate correlation, pairing the readings by time rather than by row position
+    correlation_value = comparison.compare((data_1['datetime'], data_1['value']), (data_2['datetime'], data_2['value'])).pearson
 
     # Generate the graph
     trace1 = go.Scatter(x=data_1['date'], y=data_1['value'], mode='lines', name=data1_type)
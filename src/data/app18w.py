@@ -7,6 +7,11 @@ import matplotlib.pyplot as plt
 from io import BytesIO
 import base64
 
+# Share the loader and the correlation engine with src/app.py
+import src_path
+import correlation
+from loader import read_frame
+
 # Load the data
 file_paths = {
     "AMAS23_WAT": "C:/Users/THOM/Desktop/myflaskap/AMAS23_WAT.csv",                            
@@ -25,21 +30,13 @@ file_paths = {
     "KUCH23_WAT": "C:/Users/THOM/Desktop/myflaskap/KUCH23_WAT.csv"
 }
 
-dataframes = {name: pd.read_csv(file_path) for name, file_path in file_paths.items()}
+dataframes = {name: read_frame(file_path) for name, file_path in file_paths.items()}
 
 # Modify the labels by removing the "_WAT" or other suffixes
 cleaned_names = {original: original.split('_')[0] for original in dataframes.keys()}
 
-# Compute the correlation matrix
-correlation_data = []
-for name1, df1 in dataframes.items():
-    row_data = []
-    for name2, df2 in dataframes.items():
-        correlation = df1['value'].corr(df2['value'])
-        row_data.append(correlation)
-    correlation_data.append(row_data)
-
-correlation_matrix = pd.DataFrame(correlation_data, columns=dataframes.keys(), index=dataframes.keys())
+# Compute the correlation matrix: every pair at once, matched by timestamp
+correlation_matrix = correlation.correlation_matrix({name: (df['datetime'], df['value']) for name, df in dataframes.items()})
 correlation_matrix.columns = [cleaned_names[col] for col in correlation_matrix.columns]
 correlation_matrix.index = [cleaned_names[idx] for idx in correlation_matrix.index]
 
@@ -7,6 +7,11 @@ import matplotlib.pyplot as plt
 from io import BytesIO
 import base64
 
+# Share the loader and the correlation engine with src/app.py
+import src_path
+import correlation
+from loader import read_frame
+
 # Load the radon data
 radon_file_paths = {
     "PARA23_RAD": "C:/Users/THOM/Desktop/myflaskap/PARA23_RAD.csv", 
@@ -27,21 +32,13 @@ radon_file_paths = {
     "METS23_RAD": "C:/Users/THOM/Desktop/myflaskap/METS23_RAD.csv"
 }
 
-radon_dataframes = {name: pd.read_csv(file_path) for name, file_path in radon_file_paths.items()}
+radon_dataframes = {name: read_frame(file_path) for name, file_path in radon_file_paths.items()}
 
 # Modify the labels by removing the "_RADON" or other suffixes
 cleaned_radon_names = {original: original.split('_')[0] for original in radon_dataframes.keys()}
 
-# Compute the correlation matrix for radon data
-radon_correlation_data = []
-for name1, radon_df1 in radon_dataframes.items():
-    radon_row_data = []
-    for name2, radon_df2 in radon_dataframes.items():
-        radon_correlation = radon_df1['value'].corr(radon_df2['value'])
-        radon_row_data.append(radon_correlation)
-    radon_correlation_data.append(radon_row_data)
-
-radon_correlation_matrix = pd.DataFrame(radon_correlation_data, columns=radon_dataframes.keys(), index=radon_dataframes.keys())
+# Compute the correlation matrix for radon data: every pair at once, matched by timestamp
+radon_correlation_matrix = correlation.correlation_matrix({name: (df['datetime'], df['value']) for name, df in radon_dataframes.items()})
 radon_correlation_matrix.columns = [cleaned_radon_names[col] for col in radon_correlation_matrix.columns]
 radon_correlation_matrix.index = [cleaned_radon_names[idx] for idx in radon_correlation_matrix.index]
 
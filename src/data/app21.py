@@ -4,6 +4,10 @@ from dash.dependencies import Input, Output
 import os
 import pandas as pd
 
+# Share the tail reader with src/app.py
+import src_path
+from latest import read_latest
+
 # Define the path where CSV files are located
 path_to_csvs = "C:/Users/THOM/Desktop/myflaskap/"
 
@@ -14,15 +18,14 @@ def list_csv_files(path):
 
 # Extract the latest date and value from a given CSV file
 def get_latest_data(file):
-    df = pd.read_csv(os.path.join(path_to_csvs, file))
-    
-    # Convert to datetime and sort
-    df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['hour'])
-    df_sorted = df.sort_values(by='datetime', ascending=False)
-    
-    # Extract latest information
-    latest_entry = df_sorted.iloc[0]
-    return latest_entry['date'], latest_entry['hour'], latest_entry['value']
+    # Only the end of the file is read; no full parse and sort
+    latest = read_latest(os.path.join(path_to_csvs, file))
+    # An empty or header-only file has no reading to show
+    if latest is None or pd.isna(latest[0]):
+        return '', '', ''
+    latest_time, latest_value = latest
+    latest_time = pd.Timestamp(latest_time)
+    return latest_time.strftime('%m/%d/%y'), latest_time.strftime('%H:%M'), latest_value
 
 # Start the app
 app = dash.Dash(__name__)
@@ -7,6 +7,11 @@ import matplotlib.pyplot as plt
 from io import BytesIO
 import base64
 
+# Share the loader and the correlation engine with src/app.py
+import src_path
+import correlation
+from loader import read_frame
+
 # Load the mag data
 mag_file_paths = {
     "HOVT23_MAG": "C:/Users/THOM/Desktop/myflaskap/HOVT23_MAG.csv", 
@@ -17,21 +22,13 @@ mag_file_paths = {
     "BAVR23_MAG": "C:/Users/THOM/Desktop/myflaskap/BAVR23_MAG.csv",
     "JERM23_MAG": "C:/Users/THOM/Desktop/myflaskap/JERM23_MAG.csv"
 }
-mag_dataframes = {name: pd.read_csv(file_path) for name, file_path in mag_file_paths.items()}
+mag_dataframes = {name: read_frame(file_path) for name, file_path in mag_file_paths.items()}
 
 # Modify the labels by removing the "_mag" or other suffixes
 cleaned_mag_names = {original: original.split('_')[0] for original in mag_dataframes.keys()}
 
-# Compute the correlation matrix for mag data
-mag_correlation_data = []
-for name1, mag_df1 in mag_dataframes.items():
-    mag_row_data = []
-    for name2, mag_df2 in mag_dataframes.items():
-        mag_correlation = mag_df1['value'].corr(mag_df2['value'])
-        mag_row_data.append(mag_correlation)
-    mag_correlation_data.append(mag_row_data)
-
-mag_correlation_matrix = pd.DataFrame(mag_correlation_data, columns=mag_dataframes.keys(), index=mag_dataframes.keys())
+# Compute the correlation matrix for mag data: every pair at once, matched by timestamp
+mag_correlation_matrix = correlation.correlation_matrix({name: (df['datetime'], df['value']) for name, df in mag_dataframes.items()})
 mag_correlation_matrix.columns = [cleaned_mag_names[col] for col in mag_correlation_matrix.columns]
 mag_correlation_matrix.index = [cleaned_mag_names[idx] for idx in mag_correlation_matrix.index]
 
@@ -2,6 +2,9 @@ import pandas as pd
 import plotly.graph_objects as go
 from dash import Dash, dcc, html, Input, Output
 from datetime import datetime
+# Share the vectorized loader with src/app.py
+import src_path
+from loader import read_frame
 
 # Load your data
 def load_parameter_data(location, analysis, parameter=None):
@@ -12,11 +15,7 @@ def load_parameter_data(location, analysis, parameter=None):
         else:
             filename = f"C:/Users/THOM/Desktop/myflaskapp/{location}{year}_{analysis}.csv"
         try:
-            df = pd.read_csv(filename)
-            df['date'] = pd.to_datetime(df['date'])
-            df['datetime'] = pd.to_datetime(df['date'].dt.date.astype(str) + ' ' + df['hour'])
-            df['month_day'] = df['datetime'].apply(lambda x: x.replace(year=2000))
-            df['year'] = df['datetime'].dt.year
+            df = read_frame(filename)
             dfs.append(df)
         except Exception as e:
             print(f"Error while processing file {filename}: {e}")
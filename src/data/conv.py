@@ -1,40 +1,105 @@
+import argparse
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
-# Function to process the .RAD file content and return a DataFrame
-def process_rad_file(file_path):
-    # Extracting year from the file name
-    year_from_file = re.search(r"(\d{2})", file_path).group(1)
-    
-    # Reading the contents of the file
+# Patterns are compiled once instead of on every line
+DATE_PATTERN = re.compile(r":(\d{2})/(\d{2})")
+VALUE_PATTERN = re.compile(r"(\d+| {5})")
+YEAR_PATTERN = re.compile(r"(\d{2})")
+BLANK = "     "
+
+# Read a raw .RAD file line by line. Every dated line holds one reading per hour starting
+# at 00:00 after its closing ")"; five blanks mark a missing reading, also first or last
+# on the line, so only the line break is stripped. Yields (month, day, [value or nan, ...])
+# per line.
+def iter_rad_lines(file_path):
     with open(file_path, "r") as file:
-        lines = file.readlines()
-
-    # Processing each line and extracting required data
-    all_data = []
-    for line in lines:
-        # Extracting date
-        date_match = re.match(r":(\d{2}/\d{2})", line)
-        date_with_year = f"{date_match.group(1)}/{year_from_file}" if date_match else None
-        
-        # Extracting values
-        values_part = re.split(r"\)", line)[-1].strip()
-        values_found = re.findall(r"(\d+| {5})", values_part)
-        values_processed = [val if val != "     " else "" for val in values_found]
-        
-        # Appending the data to all_data list
-        hour_index = 0
-        for value in values_processed:
-            time_stamp = f"{date_with_year} {hour_index:02d}:00"
-            all_data.append([time_stamp, value])
-            hour_index += 1
-
-    # Creating a DataFrame from the extracted data
-    df = pd.DataFrame(all_data, columns=["Timestamp", "Value"])
-    return df
-
-# Example usage
-file_path = "ARTK21.RAD"
-df_processed = process_rad_file(file_path)
-csv_path = "processed_data_with_year.csv"
-df_processed.to_csv(csv_path, index=False)
+        for line in file:
+            date_match = DATE_PATTERN.match(line)
+            if not date_match:
+                continue
+            values_part = line.rsplit(")", 1)[-1].rstrip("\r\n")
+            values = [np.nan if val == BLANK else float(val) for val in VALUE_PATTERN.findall(values_part)]
+            yield int(date_match.group(1)), int(date_match.group(2)), values
+
+# Function to process the .RAD file content and return a DataFrame with typed columns:
+# datetime (datetime64) and value (float64, NaN where the reading is missing)
+def process_rad_file(file_path):
+    # Extracting year from the file name, e.g. ARTK21.RAD -> 2021
+    year = 2000 + int(YEAR_PATTERN.search(Path(file_path).name).group(1))
+
+    days, counts, values = [], [], []
+    for month, day, line_values in iter_rad_lines(file_path):
+        days.append(np.datetime64(f"{year:04d}-{month:02d}-{day:02d}"))
+        counts.append(len(line_values))
+        values.extend(line_values)
+
+    counts = np.asarray(counts, dtype=np.int64)
+    day_starts = np.repeat(np.asarray(days, dtype='datetime64[D]'), counts).astype('datetime64[h]')
+    # Hour index within each line: 0, 1, 2, ... restarting on every line
+    hours = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return pd.DataFrame({
+        'datetime': day_starts + hours.astype('timedelta64[h]'),
+        'value': np.asarray(values, dtype=np.float64),
+    })
+
+# Write the date,hour,value schema src/app.py reads (01/31/21,05:00,123)
+def write_series_csv(df, csv_path):
+    times = df['datetime'].to_numpy()
+    day_codes, days = pd.factorize(times.astype('datetime64[D]'))
+    hour_of_day = (times.astype('datetime64[h]') - times.astype('datetime64[D]')).astype(np.int64)
+    values = df['value']
+    # Counts are written as integers like the existing station files; blanks stay empty
+    if np.all(np.isnan(values) | (values == np.round(values))):
+        values = values.astype('Int64')
+    out = pd.DataFrame({
+        'date': pd.DatetimeIndex(days).strftime('%m/%d/%y').to_numpy()[day_codes],
+        'hour': np.char.add(np.char.zfill(hour_of_day.astype(str), 2), ':00'),
+        'value': values,
+    })
+    out.to_csv(csv_path, index=False)
+
+# ARTK21.RAD -> <out_dir>/ARTK21_RAD.csv. A file without a dated line is skipped rather
+# than written as a header-only CSV the loader cannot read; returns None for it.
+def convert_file(file_path, out_dir):
+    file_path = Path(file_path)
+    df = process_rad_file(file_path)
+    if df.empty:
+        print(f"Skipping {file_path}: no dated lines")
+        return None
+    csv_path = Path(out_dir) / f"{file_path.stem.upper()}_RAD.csv"
+    write_series_csv(df, csv_path)
+    return str(csv_path)
+
+# Convert every .RAD file of a directory, one process per file up to `workers`
+def convert_directory(in_dir, out_dir, workers=None):
+    files = sorted(p for p in Path(in_dir).iterdir() if p.suffix.upper() == ".RAD")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        written = pool.map(convert_file, files, [out_dir] * len(files))
+        return [path for path in written if path is not None]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert raw .RAD station files into date,hour,value CSV files.")
+    parser.add_argument('source', help="a .RAD file or a directory of them")
+    parser.add_argument('--out', default=os.path.dirname(os.path.abspath(__file__)), help="directory to write the CSV files to")
+    parser.add_argument('--workers', type=int, default=None, help="processes used for a directory (default: one per CPU)")
+    parser.add_argument('--store', action='store_true', help="also convert the output directory into the binary series store")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        written = convert_directory(args.source, args.out, args.workers)
+    else:
+        written = [path for path in [convert_file(args.source, args.out)] if path is not None]
+    print(f"Wrote {len(written)} file(s) to {args.out}")
+
+    if args.store:
+        # Share the store ingest with src/app.py
+        import src_path
+        from series_store import ingest
+        print(f"Converted {ingest(args.out, Path(args.out) / 'store')} series into the store")
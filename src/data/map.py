@@ -1,8 +1,13 @@
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
-import requests
-import sqlite3
+
+from pathlib import Path
+
+# Share the event store with src/app.py
+import src_path
+from event_store import EventStore
+from usgs_feed import FEED_URL, FeedPoller
 
 app = dash.Dash(__name__)
 
@@ -29,13 +34,13 @@ app.layout = html.Div([
 
 manually_added_earthquakes = []
 
-# Create a function to handle database operations
-def perform_database_operation(query, *args):
-    conn = sqlite3.connect('earthquakes.db')
-    cursor = conn.cursor()
-    cursor.execute(query, args)
-    conn.commit()
-    conn.close()
+# Pooled, WAL-mode access to earthquakes.db next to this file
+event_store = EventStore(Path(__file__).resolve().parent / 'earthquakes.db')
+
+# The USGS feed is fetched in the background (set USGS_FEED_URL to use a local copy);
+# the callback only reads the features it last parsed
+feed = FeedPoller(FEED_URL, event_store)
+feed.start()
 
 @app.callback(
     Output('earthquake-map', 'figure'),
@@ -57,26 +62,22 @@ def update_map(n_clicks, latitude, longitude, date_time, magnitude, intensity):
             'visible': True  # Set the visibility property for blinking animation
         }
         
-        perform_database_operation('''
-            INSERT INTO earthquakes (latitude, longitude, date_time, magnitude, intensity)
-            VALUES (?, ?, ?, ?, ?)
-        ''', latitude, longitude, date_time, magnitude, intensity)
+        try:
+            event_store.insert([new_earthquake])
+        except ValueError as e:  # A date and time that cannot be read
+            print(f"Error while saving earthquake: {e}")
         
         manually_added_earthquakes.append(new_earthquake)
     
-    url = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_day.geojson"
-    response = requests.get(url)
-    data = response.json()
-
-    features = data['features']
+    features = feed.features
     
     if magnitude is not None:
-        filtered_features = [feature for feature in features if 'mag' in feature['properties'] and feature['properties']['mag'] >= magnitude]
+        filtered_features = [feature for feature in features if feature['magnitude'] >= magnitude]
     else:
         filtered_features = []
     
-    latitudes = [feature['geometry']['coordinates'][1] for feature in filtered_features]
-    longitudes = [feature['geometry']['coordinates'][0] for feature in filtered_features]
+    latitudes = [feature['latitude'] for feature in filtered_features]
+    longitudes = [feature['longitude'] for feature in filtered_features]
 
     figure = {
         'data': [
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# The prototypes in this directory run as scripts (python src/data/app12.py) and share the
+# loader, stores and services of src/app.py. Importing this module puts src/ on sys.path.
+SRC_PATH = str(Path(__file__).resolve().parent.parent)
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
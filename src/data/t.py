@@ -4,6 +4,10 @@ from dash.dependencies import Input, Output
 import os
 import pandas as pd
 
+# Share the tail reader with src/app.py
+import src_path
+from latest import read_latest
+
 # Define the path where CSV files are located
 path_to_csvs = "C:/Users/THOM/Desktop/myflaskap/"
 
@@ -32,15 +36,10 @@ app.layout = html.Div([
 @app.callback(Output('output-data', 'children'),
               [Input('dropdown-files', 'value')])
 def update_output(selected_file):
-    df = pd.read_csv(os.path.join(path_to_csvs, selected_file))
-    
-    # Convert to datetime and sort
-    df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['hour'])
-    df_sorted = df.sort_values(by='datetime', ascending=False)
-    
-    # Extract latest information
-    latest_entry = df_sorted.iloc[0]
-    latest_date, latest_hour, latest_value = latest_entry['date'], latest_entry['hour'], latest_entry['value']
+    # Only the end of the file is read; no full parse and sort
+    latest_time, latest_value = read_latest(os.path.join(path_to_csvs, selected_file))
+    latest_time = pd.Timestamp(latest_time)
+    latest_date, latest_hour = latest_time.strftime('%m/%d/%y'), latest_time.strftime('%H:%M')
 
     return html.Div([
         html.H5(f"Latest Data for {selected_file}:"),
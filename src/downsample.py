@@ -0,0 +1,71 @@
+import numpy as np
+
+# Downsampling keeps at most this many points per trace; one per horizontal pixel
+# of the 1200 px plot is as much as the browser can show anyway.
+DEFAULT_POINTS = 1200
+
+
+# Largest-Triangle-Three-Buckets: keeps the first and last point and, from every bucket
+# in between, the point forming the largest triangle with the point kept in the
+# previous bucket and the average of the next bucket. Returns the kept indices.
+def lttb(x, y, n_out=DEFAULT_POINTS):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n - 2 interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Average point of every bucket, used as the third triangle corner
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+# Min/max envelope: keeps the lowest and highest point of every bucket, in time order,
+# so spikes survive however far the series is reduced. Returns the kept indices.
+def minmax(y, n_out=DEFAULT_POINTS):
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+
+    # Pad to whole buckets so the search is one reshape + argmin/argmax
+    size = -(-n // buckets)
+    low = np.full(buckets * size, np.inf)
+    high = np.full(buckets * size, -np.inf)
+    low[:n] = y
+    high[:n] = y
+    low = low.reshape(buckets, size)
+    high = high.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    kept = np.concatenate([offsets + low.argmin(axis=1), offsets + high.argmax(axis=1)])
+    return np.unique(kept[kept < n])
+
+# Indices of the points to plot for a trace. Gaps (NaN values) are dropped first since
+# neither method can rank them.
+def downsample(x, y, method, n_out=DEFAULT_POINTS):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if method == 'lttb':
+        return valid[lttb(x[valid], y[valid], n_out)]
+    if method == 'minmax':
+        return valid[minmax(y[valid], n_out)]
+    raise ValueError(f"Unknown downsampling method: {method}")
@@ -0,0 +1,237 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# The earthquake catalog shared by src/data/map.py and the station graphs
+EVENTS_DB = Path(__file__).parent / "data" / "earthquakes.db"
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS earthquakes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        latitude REAL,
+        longitude REAL,
+        date_time TEXT,
+        magnitude REAL,
+        intensity TEXT,
+        event_id TEXT
+    )
+'''
+
+# event_id is the USGS feature id; rows entered by hand have none. Tables created before
+# the column existed get it added.
+ADD_EVENT_ID = 'ALTER TABLE earthquakes ADD COLUMN event_id TEXT'
+
+# Time-window/magnitude lookups and bounding-box lookups each read one index range
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS earthquakes_time_magnitude ON earthquakes (date_time, magnitude)',
+    'CREATE INDEX IF NOT EXISTS earthquakes_location ON earthquakes (latitude, longitude)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS earthquakes_event_id ON earthquakes (event_id)',
+)
+
+# date_time is stored as 'YYYY-MM-DD HH:MM:SS' (UTC for feed events), so text order is
+# time order and window queries can use the index. Older rows were written as YYYY.MM.DD.
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DOTTED_DATE = re.compile(r'^(\d{4})\.(\d{2})\.(\d{2})')
+MIGRATE_DOTTED_DATES = '''
+    UPDATE earthquakes
+    SET date_time = replace(substr(date_time, 1, 10), '.', '-') || ' 00:00:00'
+    WHERE date_time GLOB '[0-9][0-9][0-9][0-9].[0-9][0-9].[0-9][0-9]'
+'''
+
+COLUMNS = ('id', 'latitude', 'longitude', 'date_time', 'magnitude', 'intensity', 'event_id')
+Event = namedtuple('Event', COLUMNS)
+
+
+# Normalize a time to the stored text form. Accepts datetimes, datetime64, strings pandas
+# can parse (including the old YYYY.MM.DD) and epoch milliseconds as the USGS feed sends.
+def normalize_time(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        stamp = pd.Timestamp(int(value), unit='ms')
+    else:
+        if isinstance(value, str):
+            value = DOTTED_DATE.sub(r'\1-\2-\3', value.strip())
+        stamp = pd.Timestamp(value)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_convert('UTC').tz_localize(None)
+    return stamp.strftime(TIME_FORMAT)
+
+# Rows to insert for event mappings, in column order
+def event_rows(events):
+    return [(e['latitude'], e['longitude'], normalize_time(e.get('date_time')), e['magnitude'], e.get('intensity'),
+             e.get('event_id')) for e in events]
+
+
+class EventStore:
+    # Access layer for earthquakes.db. Every thread reuses one connection opened in WAL
+    # mode, so readers never block the writer and no request pays for a connect. Safe to
+    # share between threads; connections are reopened after a fork.
+
+    def __init__(self, path=EVENTS_DB, timeout=30.0):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        self._prepare(conn)
+        return conn
+
+    # Create the table and indexes, add the event_id column to older tables and move old
+    # dotted dates to the sortable form, once per process. The bundled earthquakes.db is
+    # kept migrated, so opening it writes nothing.
+    def _prepare(self, conn):
+        with self._lock:
+            if self._ready:
+                return
+            with conn:
+                conn.execute(SCHEMA)
+                if 'event_id' not in {row[1] for row in conn.execute('PRAGMA table_info(earthquakes)')}:
+                    conn.execute(ADD_EVENT_ID)
+                for statement in INDEXES:
+                    conn.execute(statement)
+                conn.execute(MIGRATE_DOTTED_DATES)
+            self._ready = True
+
+    # Insert events in one transaction with a single prepared statement. events are
+    # mappings with latitude, longitude, date_time, magnitude, intensity and event_id.
+    def insert(self, events):
+        rows = event_rows(events)
+        if not rows:
+            return 0
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                'INSERT INTO earthquakes (latitude, longitude, date_time, magnitude, intensity, event_id) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows)
+        return len(rows)
+
+    # Save a feed that repeats the same events on every poll. Events with an event_id are
+    # upserted on it: an unchanged event is skipped, and a revised one (USGS updates
+    # magnitudes and locations) replaces the stored row. The replacement gets a new row
+    # id, so last_id() still moves whenever the table's contents change. Rows saved
+    # before event ids were stored take the id of the feed event they match. Events
+    # without an id are matched on time, position and magnitude. Returns the number of
+    # rows written.
+    def insert_new(self, events):
+        rows = event_rows(events)
+        if not rows:
+            return 0
+        identified = [row for row in rows if row[5] is not None]
+        anonymous = [row for row in rows if row[5] is None]
+        conn = self.connection()
+        with conn:
+            conn.executemany('''
+                UPDATE OR IGNORE earthquakes SET event_id = ?6
+                WHERE event_id IS NULL AND date_time = ?3 AND magnitude = ?4 AND latitude = ?1 AND longitude = ?2
+            ''', identified)
+            conn.executemany('''
+                DELETE FROM earthquakes
+                WHERE event_id = ?6 AND NOT (latitude IS ?1 AND longitude IS ?2 AND date_time IS ?3
+                                             AND magnitude IS ?4 AND intensity IS ?5)
+            ''', identified)
+            before = conn.total_changes
+            conn.executemany('''
+                INSERT INTO earthquakes (latitude, longitude, date_time, magnitude, intensity, event_id)
+                VALUES (?1, ?2, ?3, ?4, ?5, ?6)
+                ON CONFLICT (event_id) DO NOTHING
+            ''', identified)
+            conn.executemany('''
+                INSERT INTO earthquakes (latitude, longitude, date_time, magnitude, intensity, event_id)
+                SELECT ?1, ?2, ?3, ?4, ?5, ?6
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM earthquakes
+                    WHERE date_time = ?3 AND magnitude = ?4 AND latitude = ?1 AND longitude = ?2
+                )
+            ''', anonymous)
+            return conn.total_changes - before
+
+    # Events with start <= date_time < end and magnitude >= min_magnitude, oldest first.
+    # Every bound is optional.
+    def window(self, start=None, end=None, min_magnitude=None, limit=None):
+        where, args = self._time_filter(start, end, min_magnitude)
+        return self._select(where, args, limit)
+
+    # Events inside a latitude/longitude box, optionally also limited in time and magnitude
+    def in_box(self, min_latitude, max_latitude, min_longitude, max_longitude,
+               start=None, end=None, min_magnitude=None, limit=None):
+        where, args = self._time_filter(start, end, min_magnitude)
+        where += ['latitude BETWEEN ? AND ?', 'longitude BETWEEN ? AND ?']
+        args += [min_latitude, max_latitude, min_longitude, max_longitude]
+        return self._select(where, args, limit)
+
+    def count(self, start=None, end=None, min_magnitude=None):
+        where, args = self._time_filter(start, end, min_magnitude)
+        sql = 'SELECT count(*) FROM earthquakes' + (' WHERE ' + ' AND '.join(where) if where else '')
+        return self.connection().execute(sql, args).fetchone()[0]
+
+    @staticmethod
+    def _time_filter(start, end, min_magnitude):
+        where, args = [], []
+        if start is not None:
+            where.append('date_time >= ?')
+            args.append(normalize_time(start))
+        if end is not None:
+            where.append('date_time < ?')
+            args.append(normalize_time(end))
+        if min_magnitude is not None:
+            where.append('magnitude >= ?')
+            args.append(float(min_magnitude))
+        return where, args
+
+    def _select(self, where, args, limit):
+        sql = f"SELECT {', '.join(COLUMNS)} FROM earthquakes"
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY date_time'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args = args + [int(limit)]
+        return [Event(*row) for row in self.connection().execute(sql, args)]
+
+    # Rows are only ever added or replaced by a new row (never updated in place), so the
+    # newest id identifies the table's contents; indexes built from the table are rebuilt
+    # when it changes
+    def last_id(self):
+        return self.connection().execute('SELECT max(id) FROM earthquakes').fetchone()[0]
+
+    # Every event as columns, oldest first: datetime (datetime64[s]), latitude, longitude
+    # and magnitude (float64). Rows missing any of them are left out.
+    def arrays(self):
+        rows = self.connection().execute('''
+            SELECT date_time, latitude, longitude, magnitude FROM earthquakes
+            WHERE date_time IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+              AND magnitude IS NOT NULL
+            ORDER BY date_time
+        ''').fetchall()
+        times, latitudes, longitudes, magnitudes = zip(*rows) if rows else ((), (), (), ())
+        return {
+            'datetime': pd.to_datetime(pd.Series(times, dtype=object), format=TIME_FORMAT)
+                          .to_numpy().astype('datetime64[s]'),
+            'latitude': np.asarray(latitudes, dtype=np.float64),
+            'longitude': np.asarray(longitudes, dtype=np.float64),
+            'magnitude': np.asarray(magnitudes, dtype=np.float64),
+        }
+
+    # Close this thread's connection
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class FigureCache:
+    # Bounded LRU of serialized figure JSON. With a disk_path the entries are also
+    # written there, so every gunicorn worker pointing at the same directory reuses
+    # figures built by the others.
+
+    def __init__(self, maxsize=128, disk_path=None, disk_maxsize=2048):
+        self.maxsize = maxsize
+        self.disk_path = disk_path
+        self.disk_maxsize = disk_maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    @staticmethod
+    def file_name(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest() + '.json'
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if not self.disk_path:
+            return None
+        try:
+            with open(os.path.join(self.disk_path, self.file_name(key))) as f:
+                figure_json = f.read()
+        except FileNotFoundError:
+            return None
+        self._remember(key, figure_json)
+        return figure_json
+
+    def put(self, key, figure_json):
+        self._remember(key, figure_json)
+        if self.disk_path:
+            path = os.path.join(self.disk_path, self.file_name(key))
+            # Write then rename so other workers never read a partial file
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                f.write(figure_json)
+            os.replace(tmp, path)
+            self._prune_disk()
+
+    def _remember(self, key, figure_json):
+        with self._lock:
+            self._entries[key] = figure_json
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    # Entries for old data versions are never read again; drop the oldest files once
+    # the directory grows past disk_maxsize
+    def _prune_disk(self):
+        names = [name for name in os.listdir(self.disk_path) if name.endswith('.json')]
+        if len(names) <= self.disk_maxsize:
+            return
+        paths = [os.path.join(self.disk_path, name) for name in names]
+        aged = []
+        for path in paths:
+            try:
+                aged.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                pass
+        aged.sort()
+        for _, path in aged[:len(aged) - self.disk_maxsize]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class VersionedCache:
+    # Bounded LRU of results computed from versioned data, such as station series whose
+    # version is the stamps of their files. A result is only served for the version it was
+    # built from and is replaced when the data changes; past maxsize the least recently
+    # used key is dropped.
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # The result stored for key at this version, or build() stored as it
+    def get(self, key, version, build):
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                return cached[1]
+        result = build()
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Memoize a figure-building function: build(*args) must return a plotly Figure.
+# Returns the figure as a plain dict, which Dash serializes without rebuilding objects.
+def memoized_figure(cache, key, build, *args):
+    figure_json = cache.get(key)
+    if figure_json is None:
+        figure_json = build(*args).to_json()
+        cache.put(key, figure_json)
+    return json.loads(figure_json)
@@ -0,0 +1,74 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from catalog import SERIES_ANALYSES
+from loader import parse_datetime, tail_lines
+
+# Newest reading of one station series; datetime is None when its files have no rows
+LatestReading = namedtuple('LatestReading', ['location', 'analysis', 'code', 'datetime', 'value'])
+
+
+# (datetime64, value) of the newest reading in a station CSV, or None when the file has
+# no rows. Only the file's last bytes are read. Rows there are compared by time rather
+# than position, because a few files have their last rows out of order; readings without
+# a value are passed over while the tail has any with one.
+def read_latest(path):
+    with open(path, 'rb') as f:
+        rows = [line.split(',') for line in tail_lines(f)]
+    rows = [row for row in rows if len(row) >= 3 and row[0] != 'date']
+    if not rows:
+        return None
+    times = parse_datetime(pd.Series([row[0] for row in rows]), pd.Series([row[1] for row in rows]))
+    values = pd.to_numeric(pd.Series([row[2] for row in rows]), errors='coerce').to_numpy(dtype=np.float64)
+    candidates = np.flatnonzero(~np.isnan(values))
+    if not len(candidates):
+        candidates = np.arange(len(rows))
+    newest = candidates[np.flatnonzero(times[candidates] == times[candidates].max())[-1]]
+    return times[newest], values[newest]
+
+
+class LatestIndex:
+    # Newest reading of every hourly series, from the tail of its latest year file. A file
+    # is read again only when its catalog stamp changes (an append or a replaced file),
+    # so a call costs O(number of series) and no full parses.
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._tails = {}
+        self._lock = threading.Lock()
+
+    def _tail(self, entry):
+        key = (entry.location, entry.code, entry.year)
+        with self._lock:
+            cached = self._tails.get(key)
+        if cached is not None and cached[0] == entry.stamp:
+            return cached[1]
+        try:
+            latest = read_latest(entry.path)
+        except (OSError, ValueError) as e:
+            print(f"Error while reading the tail of {entry.path}: {e}")
+            latest = None
+        with self._lock:
+            self._tails[key] = (entry.stamp, latest)
+        return latest
+
+    def readings(self, analyses=SERIES_ANALYSES):
+        files = {}
+        for entry in self.catalog:
+            if entry.analysis in analyses:
+                files.setdefault((entry.location, entry.code), []).append(entry)
+
+        readings = []
+        for (location, code), entries in sorted(files.items()):
+            latest = None
+            # Fall back to an earlier year when the newest file has no rows yet
+            for entry in sorted(entries, key=lambda e: e.year, reverse=True):
+                latest = self._tail(entry)
+                if latest is not None:
+                    break
+            time, value = latest if latest is not None else (None, np.nan)
+            readings.append(LatestReading(location, entries[0].analysis, code, time, value))
+        return readings
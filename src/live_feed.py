@@ -0,0 +1,48 @@
+import threading
+
+import numpy as np
+
+from series_cache import tail
+
+
+# Epoch milliseconds of a datetime64 value, the unit live clients keep their cursor in
+def to_epoch_ms(value):
+    return int(np.datetime64(value, 'ms').astype(np.int64))
+
+
+class LiveFeed:
+    # Per-worker cursor of every series followed in live mode: the data version last seen
+    # and the time of its newest reading. A tick for a series that did not change since is
+    # answered from the cursor without touching the arrays.
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    # (version, epoch ms of the newest reading or None) of a series
+    def latest(self, location, code):
+        version = self.cache.version(location, code)
+        with self._lock:
+            cursor = self._cursors.get((location, code))
+        if cursor is not None and cursor[0] == version:
+            return cursor
+        ends = [data.times[-1] for data in self.cache.get_years(location, code).values() if len(data.times)]
+        cursor = (version, max(to_epoch_ms(end) for end in ends) if ends else None)
+        with self._lock:
+            self._cursors[(location, code)] = cursor
+        return cursor
+
+    # Readings newer than `since` (epoch ms) as {yy: SeriesData}, and the new newest time.
+    # Each year costs one binary search; the result is empty when the client is current.
+    def since(self, location, code, since):
+        _, last = self.latest(location, code)
+        if last is None or (since is not None and last <= since):
+            return {}, last
+        new = {}
+        for yy, data in self.cache.get_years(location, code).items():
+            if not len(data.times) or (since is not None and to_epoch_ms(data.times[-1]) <= since):
+                continue
+            start = 0 if since is None else int(np.searchsorted(data.times, np.datetime64(since, 'ms'), side='right'))
+            new[yy] = tail(data, start)
+        return new, last
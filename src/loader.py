@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Station files come in two date styles: 01/01/21 and 1/1/2021
+DATE_FORMATS = ('%m/%d/%y', '%m/%d/%Y')
+
+# Files parsed at the same time by load_data
+LOAD_WORKERS = 4
+
+# Every month_day value is placed in leap year 2000 so Feb 29 has a slot
+MONTH_DAY_YEAR = np.datetime64('2000-01', 'M')
+
+# Bytes read from the end of a file when only its last rows are needed
+TAIL_BYTES = 4096
+
+
+# Pick the explicit date format from the first row instead of letting pandas guess per element
+def date_format(sample):
+    year = str(sample).rsplit('/', 1)[-1]
+    return DATE_FORMATS[1] if len(year) == 4 else DATE_FORMATS[0]
+
+# Parse the date and hour columns with explicit formats. Each distinct date (365 a year)
+# and hour (24) is parsed once and broadcast back to the rows, instead of building and
+# parsing one "date hour" string per row.
+def parse_datetime(dates, hours):
+    date_codes, date_values = pd.factorize(dates.astype(str))
+    hour_codes, hour_values = pd.factorize(hours.astype(str))
+    days = pd.to_datetime(date_values, format=date_format(date_values[0])).to_numpy()
+    offsets = pd.to_timedelta(hour_values + ':00').to_numpy()
+    return days[date_codes] + offsets[hour_codes]
+
+# Same as replacing the year with 2000, done with datetime64 arithmetic instead of per-row calls
+def month_day(times):
+    times = np.asarray(times, dtype='datetime64[ns]')
+    months = times.astype('datetime64[M]')
+    month_index = months.astype(np.int64) % 12
+    shifted = (MONTH_DAY_YEAR + month_index).astype('datetime64[ns]')
+    return shifted + (times - months.astype('datetime64[ns]'))
+
+# Widen stored float32 values for plotting, rounded to float32 precision (7 significant
+# digits) so 11.53 comes back as 11.53 rather than 11.529999732971191
+def as_float64(values):
+    values = np.asarray(values)
+    if values.dtype != np.float32:
+        return values.astype(np.float64, copy=False)
+    wide = values.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        digits = 6 - np.floor(np.log10(np.abs(wide)))
+        scale = 10.0 ** np.where(np.isfinite(digits), digits, 0)
+        return np.where(np.isfinite(digits), np.round(wide * scale) / scale, wide)
+
+# Read one {location}{yy}_{code}.csv file with the derived columns the apps plot
+def read_frame(file):
+    df = pd.read_csv(file, dtype={'date': str, 'hour': str})
+    times = parse_datetime(df['date'], df['hour'])
+    df['date'] = times.astype('datetime64[D]').astype('datetime64[ns]')
+    df['datetime'] = times
+    df['month_day'] = month_day(times)
+    df['year'] = times.astype('datetime64[Y]').astype(np.int64) + 1970
+    # A few station files have rows out of order; sort them once here so every consumer
+    # can rely on time order
+    if not df['datetime'].is_monotonic_increasing:
+        df = df.sort_values(by='datetime', kind='stable', ignore_index=True)
+    return df
+
+# Complete, non-blank lines in the last `size` bytes of a file opened in binary mode,
+# without reading the rest of it
+def tail_lines(f, size=TAIL_BYTES):
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    f.seek(max(0, end - size))
+    lines = f.read().decode().splitlines()
+    if end > size:
+        lines = lines[1:]  # The first line was cut by the seek
+    return [line.strip() for line in lines if line.strip()]
+
+# Fall back to the raw frame when a file cannot be parsed, as the apps always did
+def read_frame_or_raw(file):
+    try:
+        return read_frame(file)
+    except Exception as e:
+        print(f"Error while processing file {file}: {e}")
+        return pd.read_csv(file)
+
+# Load your data. The files are parsed concurrently and returned in the order given.
+def load_data(files):
+    files = list(files)
+    if len(files) <= 1:
+        return dict(enumerate(map(read_frame_or_raw, files)))
+    with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(files))) as pool:
+        return dict(enumerate(pool.map(read_frame_or_raw, files)))
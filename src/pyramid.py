@@ -0,0 +1,86 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Aggregation levels as (name, bucket width in hours), finest first
+LEVELS = (
+    ('hourly', 1),
+    ('6-hourly', 6),
+    ('daily', 24),
+    ('weekly', 24 * 7),
+)
+
+# One level of the pyramid. times holds each bucket's start as datetime64[h]; count is
+# the number of non-missing readings in the bucket.
+Level = namedtuple('Level', ['times', 'mean', 'min', 'max', 'count'])
+
+
+# Aggregate readings into buckets of `hours` width with one sort and a few reduceat calls
+def aggregate(times, values, hours):
+    stamps = np.asarray(times).astype('datetime64[h]').astype(np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(stamps) == 0:
+        empty = np.empty(0)
+        return Level(empty.astype('datetime64[h]'), empty, empty, empty, empty.astype(np.int64))
+
+    buckets = stamps // hours
+    if np.any(buckets[1:] < buckets[:-1]):
+        order = np.argsort(buckets, kind='stable')
+        buckets, values = buckets[order], values[order]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+    present = ~np.isnan(values)
+    count = np.add.reduceat(present.astype(np.int64), starts)
+    total = np.add.reduceat(np.where(present, values, 0.0), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+    low = np.fmin.reduceat(values, starts)
+    high = np.fmax.reduceat(values, starts)
+    return Level((buckets[starts] * hours).astype('datetime64[h]'), mean, low, high, count)
+
+# Build every level of the pyramid for one series, keyed by level name
+def build_pyramid(times, values):
+    return {name: aggregate(times, values, hours) for name, hours in LEVELS}
+
+# Readings appended from index `start` on only touch the last buckets of every level:
+# re-aggregate from the first touched bucket and keep everything before it
+def extend_pyramid(pyramid, times, values, start):
+    stamps = np.asarray(times).astype('datetime64[h]').astype(np.int64)
+    extended = {}
+    for name, hours in LEVELS:
+        level = pyramid[name]
+        first = stamps[start] // hours * hours
+        keep = np.searchsorted(level.times.astype(np.int64), first)
+        raw_from = np.searchsorted(stamps, first)
+        tail = aggregate(stamps[raw_from:].astype('datetime64[h]'), values[raw_from:], hours)
+        extended[name] = Level(*(np.concatenate([getattr(level, field)[:keep], getattr(tail, field)])
+                                 for field in Level._fields))
+    return extended
+
+# Coarsest level that still gives at least `points` buckets over a span of `span_hours`,
+# so a multi-year view costs about the same as a single year
+def pick_level(span_hours, points):
+    chosen = LEVELS[0][0]
+    for name, hours in LEVELS:
+        if span_hours / hours >= points:
+            chosen = name
+    return chosen
+
+# Flatten a pyramid into arrays for np.savez
+def pack_pyramid(pyramid):
+    arrays = {}
+    for name, level in pyramid.items():
+        for field in Level._fields:
+            value = getattr(level, field)
+            if field == 'times':
+                value = value.astype(np.int64)
+            arrays[f"{name}_{field}"] = value
+    return arrays
+
+def unpack_pyramid(arrays):
+    pyramid = {}
+    for name, _ in LEVELS:
+        fields = {field: arrays[f"{name}_{field}"] for field in Level._fields}
+        fields['times'] = fields['times'].astype('datetime64[h]')
+        pyramid[name] = Level(**fields)
+    return pyramid
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from correlation import align_hourly, station_readings
+from figure_cache import VersionedCache
+
+# Windows with fewer readings than this fraction of their length are left blank
+MIN_COVERAGE = 0.5
+
+
+# Trailing-window sums of x for every position: sum of x[i - window + 1 ... i], from one
+# cumulative sum, so any window length costs O(n)
+def window_sums(x, window):
+    totals = np.concatenate([[0.0], np.cumsum(x)])
+    ends = np.arange(1, len(x) + 1)
+    return totals[ends] - totals[np.maximum(ends - window, 0)]
+
+# Rolling count, mean and standard deviation (ddof=1) of an hourly array with NaN gaps
+def rolling_mean_std(x, window, min_periods=None):
+    x = np.asarray(x, dtype=np.float64)
+    present = ~np.isnan(x)
+    min_periods = min_periods or max(2, int(window * MIN_COVERAGE))
+    # Centered values keep the sums of squares small enough not to cancel
+    offset = x[present].mean() if present.any() else 0.0
+    centered = np.where(present, x - offset, 0.0)
+
+    count = window_sums(present.astype(np.float64), window)
+    total = window_sums(centered, window)
+    squares = window_sums(centered * centered, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        variance = np.maximum(squares - count * mean * mean, 0.0) / (count - 1)
+    enough = count >= min_periods
+    return count, np.where(enough, mean + offset, np.nan), np.where(enough, np.sqrt(variance), np.nan)
+
+# How many rolling standard deviations each reading lies from its rolling mean
+def rolling_zscore(x, window, min_periods=None):
+    _, mean, std = rolling_mean_std(x, window, min_periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(std > 0, (np.asarray(x, dtype=np.float64) - mean) / std, np.nan)
+
+# Rolling Pearson correlation of two hourly arrays over the hours both have a reading
+def rolling_corr(a, b, window, min_periods=None):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    both = ~(np.isnan(a) | np.isnan(b))
+    min_periods = min_periods or max(2, int(window * MIN_COVERAGE))
+    a = np.where(both, a - (a[both].mean() if both.any() else 0.0), 0.0)
+    b = np.where(both, b - (b[both].mean() if both.any() else 0.0), 0.0)
+
+    count = window_sums(both.astype(np.float64), window)
+    sum_a, sum_b = window_sums(a, window), window_sums(b, window)
+    sum_aa, sum_bb = window_sums(a * a, window), window_sums(b * b, window)
+    sum_ab = window_sums(a * b, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = count * sum_ab - sum_a * sum_b
+        variance = (count * sum_aa - sum_a ** 2) * (count * sum_bb - sum_b ** 2)
+        r = covariance / np.sqrt(variance)
+    return np.where((count >= min_periods) & (variance > 0), np.clip(r, -1.0, 1.0), np.nan)
+
+
+# Overlays offered on the station graph
+OVERLAYS = ('mean', 'zscore', 'corr')
+
+
+class RollingStatistics:
+    # Rolling overlays of station series on their hourly grid, kept per worker and
+    # recomputed only when a file behind them changes. Series are (location, code) pairs.
+
+    def __init__(self, cache, maxsize=64):
+        self.cache = cache
+        self._results = VersionedCache(maxsize)
+
+    # Hourly frame for one overlay: columns mean/std for 'mean', zscore for 'zscore' and
+    # corr (with `other`) for 'corr'
+    def overlay(self, series, kind, window_hours, other=None):
+        involved = (series, other) if kind == 'corr' else (series,)
+        version = tuple(self.cache.version(*s) for s in involved)
+        key = (series, kind, window_hours, other if kind == 'corr' else None)
+        return self._results.get(key, version, lambda: self._build(series, kind, window_hours, other, involved))
+
+    def _build(self, series, kind, window_hours, other, involved):
+        hourly = align_hourly({s: station_readings(self.cache, *s) for s in involved})
+        values = hourly[series].to_numpy() if len(hourly.columns) else np.array([])
+        if kind == 'mean':
+            _, mean, std = rolling_mean_std(values, window_hours)
+            return pd.DataFrame({'mean': mean, 'std': std}, index=hourly.index)
+        if kind == 'zscore':
+            return pd.DataFrame({'zscore': rolling_zscore(values, window_hours)}, index=hourly.index)
+        return pd.DataFrame({'corr': rolling_corr(values, hourly[other].to_numpy(), window_hours)}, index=hourly.index)
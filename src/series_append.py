@@ -0,0 +1,140 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked against each other
+    fcntl = None
+
+from catalog import Catalog, SERIES_FILE
+from loader import DATE_FORMATS, date_format, parse_datetime, tail_lines
+from series_cache import SeriesCache, load_series
+
+HEADER = 'date,hour,value\n'
+
+
+# Readings as (datetime64[h] times, float64 values), floored to the hour and in time order.
+# Times are ISO 8601 strings ("2022-06-01 13:00"), datetimes or datetime64, in the years
+# a file name can hold (2000-2099). A value may be missing (None/NaN, written as a blank)
+# but not anything other than a number. Raises ValueError for any other reading.
+def parse_readings(readings):
+    if not len(readings):
+        return np.array([], dtype='datetime64[h]'), np.array([], dtype=np.float64)
+    times, values = zip(*readings)
+    times = pd.to_datetime(list(times), format='ISO8601').to_numpy().astype('datetime64[h]')
+    missing = np.flatnonzero(np.isnat(times))
+    if len(missing):
+        raise ValueError(f"reading {missing[0]} has no time")
+    years = times.astype('datetime64[Y]').astype(np.int64) + 1970
+    outside = np.flatnonzero((years < 2000) | (years > 2099))
+    if len(outside):
+        raise ValueError(f"reading {outside[0]} is outside 2000-2099")
+    raw = pd.Series(values, dtype=object)
+    numeric = pd.to_numeric(raw, errors='coerce')
+    invalid = np.flatnonzero((numeric.isna() & raw.notna()) | raw.map(lambda v: isinstance(v, bool)))
+    if len(invalid):
+        raise ValueError(f"reading {invalid[0]} has a value that is not a number: {raw[invalid[0]]!r}")
+    values = numeric.to_numpy(dtype=np.float64)
+    order = np.argsort(times, kind='stable')
+    return times[order], values[order]
+
+# First and last data rows of a CSV, reading only its head and tail
+def edge_rows(f):
+    f.seek(0)
+    f.readline()
+    first = f.readline().decode().strip()
+    lines = tail_lines(f)
+    last = lines[-1] if lines else ''
+    return (first or None), (last if last and last != HEADER.strip() else None)
+
+def ends_with_newline(f):
+    f.seek(-1, os.SEEK_END)
+    ends = f.read(1) == b'\n'
+    f.seek(0, os.SEEK_END)
+    return ends
+
+def row_time(row):
+    date, hour = row.split(',')[:2]
+    return parse_datetime(pd.Series([date]), pd.Series([hour]))[0]
+
+def format_value(value):
+    return '' if np.isnan(value) else np.format_float_positional(value, trim='-')
+
+# Append readings to the year files of a series, e.g. append_readings(cache, 'SHIR', 'WAT',
+# [('2022-06-01 13:00', -40.1)]). Readings at or before the last row already in a file
+# are skipped, so re-sending a batch is harmless. The catalog and the cached arrays,
+# statistics and aggregates are updated in place; figures keyed on the series version are
+# rebuilt on their next request. Returns the number of rows written.
+def append_readings(cache, location, code, readings):
+    times, values = parse_readings(readings)
+    years = times.astype('datetime64[Y]').astype(np.int64) + 1970
+    written = 0
+    for year in np.unique(years):
+        selected = years == year
+        path = cache.path_for(location, code, int(year) % 100)
+        rows_written = append_year(path, times[selected], values[selected])
+        if not rows_written:
+            continue
+        written += len(rows_written[2])
+        if cache.catalog is not None:
+            cache.catalog.touch(path)
+        cache.extend(location, code, int(year) % 100, *rows_written)
+    return written
+
+# (mtime_ns, size) of an open file, the stamp the catalog and the series cache use
+def file_stamp(f):
+    st = os.fstat(f.fileno())
+    return st.st_mtime_ns, st.st_size
+
+# Append to one year file under an exclusive lock. Returns (stamp before, stamp after,
+# times, values written), both stamps read under the lock, or None when every reading was
+# already there.
+def append_year(path, times, values):
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            before = file_stamp(f)
+            first, last = edge_rows(f)
+            if last is not None:
+                newer = times > row_time(last)
+                times, values = times[newer], values[newer]
+            if not len(times):
+                return None
+            # Keep the date format the file already uses
+            fmt = date_format(first.split(',')[0]) if first else DATE_FORMATS[0]
+            stamps = pd.DatetimeIndex(times)
+            dates = stamps.strftime(fmt)
+            hours = stamps.strftime('%H:%M')
+            lines = ''.join(f"{date},{hour},{format_value(value)}\n" for date, hour, value in zip(dates, hours, values))
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                lines = HEADER + lines
+            elif not ends_with_newline(f):
+                lines = '\n' + lines
+            f.write(lines.encode())
+            f.flush()
+            after = file_stamp(f)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    return before, after, times.astype('datetime64[ns]'), values
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Append datetime,value readings from stdin to a station series.")
+    parser.add_argument('location', help="station code, e.g. SHIR")
+    parser.add_argument('code', help="file code, e.g. WAT or CA_")
+    parser.add_argument('--data', default=str(Path(__file__).parent / "data"), help="directory holding the station CSV files")
+    args = parser.parse_args()
+
+    if not SERIES_FILE.match(f"{args.location}21_{args.code}.csv"):
+        parser.error(f"not a series: {args.location} {args.code}")
+    readings = [line.strip().split(',')[:2] for line in sys.stdin if line.strip()]
+    cache = SeriesCache(args.data, load_series, catalog=Catalog(args.data))
+    print(f"Appended {append_readings(cache, args.location, args.code, readings)} reading(s)")
@@ -0,0 +1,208 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from loader import month_day, read_frame
+from pyramid import build_pyramid, extend_pyramid
+
+# Parsed arrays for one {location}{yy}_{code}.csv file
+SeriesData = namedtuple('SeriesData', ['times', 'month_day', 'values'])
+
+# Parse one CSV file into the arrays kept by the series cache
+def load_series(file):
+    df = read_frame(file)
+    return SeriesData(df['datetime'].to_numpy(), df['month_day'].to_numpy(), df['value'].to_numpy())
+
+# Readings of a series from index `start` on
+def tail(data, start):
+    return SeriesData(data.times[start:], data.month_day[start:], data.values[start:])
+
+# Two-digit years the dashboard looks for (2021 ... 2030)
+YEARS = range(21, 31)
+
+# Year files parsed concurrently on a cold view. pandas' C parser releases the GIL, so a
+# few threads are enough to make the view cost the slowest file rather than the sum.
+LOAD_WORKERS = 4
+
+
+class SeriesCache:
+    # Per-worker cache of parsed series keyed on (location, code, year).
+    # An entry is reused until the file's mtime or size changes, so a repeat
+    # view of the same station costs a stat() per year, or nothing with a catalog.
+
+    def __init__(self, base_path, load_file, store=None, catalog=None):
+        self.base_path = base_path
+        self.load_file = load_file
+        # Optional SeriesStore; series found there are memory-mapped instead of parsed
+        self.store = store
+        # Optional Catalog; when given, file existence and stamps come from its last scan
+        # instead of a stat() per year on every request
+        self.catalog = catalog
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    # Thread pool for cold loads, created lazily so a gunicorn worker forked after a
+    # preload never inherits a pool whose threads did not survive the fork
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix='series-load')
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    @staticmethod
+    def stem_for(location, code, year):
+        return f"{location}{year:02d}_{code}"
+
+    def path_for(self, location, code, year):
+        return os.path.join(self.base_path, self.stem_for(location, code, year) + ".csv")
+
+    # (mtime_ns, size) and path of a year file, or (None, None) when it does not exist
+    def _stamp(self, location, code, year):
+        if self.catalog is not None:
+            entry = self.catalog.get(location, code, year)
+            return (entry.stamp, entry.path) if entry is not None else (None, None)
+        path = self.path_for(location, code, year)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None, None
+        return (st.st_mtime_ns, st.st_size), path
+
+    # Returns the current cache entry for the series, loading it if the file changed.
+    # An entry is [stamp, SeriesData, {name: (derived product, extend function)}].
+    def _entry(self, location, code, year):
+        stamp, path = self._stamp(location, code, year)
+        if stamp is None:
+            return None
+        key = (location, code, year)
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry
+
+        data = None
+        if self.store is not None:
+            data = self.store.open(self.stem_for(location, code, year), stamp)
+        if data is None:
+            data = self.load_file(path)
+        entry = [stamp, data, {}]
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def get(self, location, code, year):
+        entry = self._entry(location, code, year)
+        return entry[1] if entry is not None else None
+
+    # Products computed from a series (aggregates, statistics) live next to it and are
+    # dropped together with it when the file changes. extend(product, data, start), when
+    # given, updates the product in place of a rebuild after readings are appended
+    # from index `start` on.
+    def derived(self, location, code, year, name, build, extend=None):
+        entry = self._entry(location, code, year)
+        if entry is None:
+            return None
+        products = entry[2]
+        if name not in products:
+            products[name] = (build(entry[0], entry[1]), extend)
+        return products[name][0]
+
+    # Readings appended to a year file in this process: grow the cached arrays and the
+    # derived products instead of re-reading the file. before and after are the file's
+    # stamps just before and after the append, read under its lock. The entry is only
+    # grown if it holds exactly the file as it was before the append; if anything else
+    # wrote to the file in between (another worker, the CLI) it is dropped and the next
+    # request reloads the file. Series that are not cached are left to load normally.
+    def extend(self, location, code, year, before, after, times, values):
+        key = (location, code, year)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != before:
+                del self._entries[key]
+                entry = None
+        if entry is None:
+            return False
+
+        old = entry[1]
+        # Extended series are held in datetime64[ns], like parsed CSVs, whatever unit the
+        # cached arrays came in (the store keeps hours)
+        times = np.asarray(times).astype('datetime64[ns]')
+        data = SeriesData(
+            np.concatenate([np.asarray(old.times).astype('datetime64[ns]'), times]),
+            np.concatenate([old.month_day, month_day(times)]),
+            np.concatenate([old.values, np.asarray(values, dtype=old.values.dtype)]),
+        )
+        start = len(old.times)
+        products = {}
+        for name, (product, extend) in entry[2].items():
+            if extend is not None:
+                products[name] = (extend(product, data, start), extend)
+
+        with self._lock:
+            # Another thread may have reloaded or extended the entry meanwhile
+            if self._entries.get(key) is not entry:
+                return False
+            self._entries[key] = [after, data, products]
+        return True
+
+    # Hourly/6-hourly/daily/weekly aggregates, from the store when precomputed there
+    def pyramid(self, location, code, year):
+        def build(stamp, data):
+            pyramid = None
+            if self.store is not None:
+                pyramid = self.store.open_pyramid(self.stem_for(location, code, year), stamp)
+            if pyramid is None:
+                pyramid = build_pyramid(data.times, data.values)
+            return pyramid
+        return self.derived(location, code, year, 'pyramid', build,
+                            lambda pyramid, data, start: extend_pyramid(pyramid, data.times, data.values, start))
+
+    # Data version stamp of a station series: (year, mtime_ns, size) of every year file.
+    # Changes whenever any of the files is replaced or appended to.
+    def version(self, location, code, years=None):
+        if self.catalog is not None and years is None:
+            return self.catalog.version(location, code)
+        stamps = []
+        for year in years or YEARS:
+            stamp, _ = self._stamp(location, code, year)
+            if stamp is not None:
+                stamps.append((year,) + stamp)
+        return tuple(stamps)
+
+    # Years to look at for a series: the cataloged ones, or every candidate year
+    def _years(self, location, code, years):
+        if years is not None:
+            return list(years)
+        if self.catalog is not None:
+            return self.catalog.years(location, code)
+        return list(YEARS)
+
+    def get_years(self, location, code, years=None):
+        # Returns {year: SeriesData} for the years that have a file, in year order
+        years = self._years(location, code, years)
+        with self._lock:
+            cold = any((location, code, year) not in self._entries for year in years)
+        if cold:
+            # Stat and parse the year files concurrently; map keeps them in year order
+            loaded = list(self._executor().map(lambda year: self.get(location, code, year), years))
+        else:
+            loaded = [self.get(location, code, year) for year in years]
+        return {year: data for year, data in zip(years, loaded) if data is not None}
+
+    # Stop the load pool, e.g. after a preload and before gunicorn forks
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
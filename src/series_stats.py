@@ -0,0 +1,60 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Per-year summary shared by the continuous and yearly views. start/end are the first and
+# last timestamps; first_day/last_day the same on the month_day (year 2000) axis.
+YearStats = namedtuple('YearStats', ['mean', 'min', 'max', 'count', 'start', 'end', 'first_day', 'last_day'])
+
+
+# All per-year aggregates of a frame in one groupby pass
+def year_summary(df):
+    grouped = df.groupby('year', sort=True).agg(
+        mean=('value', 'mean'),
+        min=('value', 'min'),
+        max=('value', 'max'),
+        count=('value', 'count'),
+        start=('datetime', 'min'),
+        end=('datetime', 'max'),
+        first_day=('month_day', 'min'),
+        last_day=('month_day', 'max'),
+    )
+    return {int(year): YearStats(*row) for year, row in zip(grouped.index, grouped.itertuples(index=False))}
+
+# Combine two summaries of consecutive stretches of the same series, e.g. the cached
+# summary and the summary of readings appended since
+def merge_summaries(a, b):
+    merged = dict(a)
+    for year, new in b.items():
+        old = merged.get(year)
+        if old is None:
+            merged[year] = new
+            continue
+        count = old.count + new.count
+        total = (old.mean * old.count if old.count else 0.0) + (new.mean * new.count if new.count else 0.0)
+        merged[year] = YearStats(
+            mean=total / count if count else np.nan,
+            min=np.fmin(old.min, new.min),
+            max=np.fmax(old.max, new.max),
+            count=count,
+            start=min(old.start, new.start),
+            end=max(old.end, new.end),
+            first_day=min(old.first_day, new.first_day),
+            last_day=max(old.last_day, new.last_day),
+        )
+    return merged
+
+# Concatenate per-year frames that are each already in time order. Only falls back to a
+# (stable) sort when the years overlap, instead of always sorting the whole history.
+# Datetime columns are brought to one unit first; frames of different units would
+# concatenate to object columns.
+def merge_years(frames):
+    frames = [df.astype({column: 'datetime64[ns]' for column in ('datetime', 'month_day') if column in df})
+              for df in frames if len(df)]
+    if not frames:
+        return pd.DataFrame(columns=['datetime', 'month_day', 'value', 'year'])
+    merged = pd.concat(frames, ignore_index=True)
+    if not merged['datetime'].is_monotonic_increasing:
+        merged = merged.sort_values(by='datetime', kind='stable', ignore_index=True)
+    return merged
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from catalog import SERIES_FILE
+from loader import month_day, read_frame
+from pyramid import build_pyramid, pack_pyramid, unpack_pyramid
+from series_cache import SeriesData
+
+MANIFEST = 'manifest.json'
+
+# Bumped whenever ingest_file writes something new, so older entries get re-converted
+FORMAT = 3
+
+# Default location of the binary store, next to the CSV files it mirrors
+DATA_PATH = Path(__file__).parent / "data"
+STORE_PATH = DATA_PATH / "store"
+
+
+def stat_stamp(st):
+    return [st.st_mtime_ns, st.st_size]
+
+# Write a file through a temporary next to it and rename it into place. Workers may have
+# the old file memory-mapped; overwriting it in place would truncate the pages under them
+# (SIGBUS), while a rename leaves their mapping on the old inode.
+def replace_file(path, write):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+# Convert one CSV into <stem>.hours.npy (int64 epoch hours), <stem>.values.npy (float32)
+# and <stem>.pyramid.npz (hourly/6-hourly/daily/weekly mean, min, max and count)
+def ingest_file(path, store_path):
+    path = Path(path)
+    df = read_frame(path)
+    hours = df['datetime'].to_numpy().astype('datetime64[h]').astype(np.int64)
+    values = df['value'].to_numpy(dtype=np.float32)
+    replace_file(store_path / f"{path.stem}.hours.npy", lambda f: np.save(f, hours))
+    replace_file(store_path / f"{path.stem}.values.npy", lambda f: np.save(f, values))
+    pyramid = pack_pyramid(build_pyramid(df['datetime'].to_numpy(), df['value'].to_numpy(dtype=np.float64)))
+    replace_file(store_path / f"{path.stem}.pyramid.npz", lambda f: np.savez(f, **pyramid))
+    return {
+        'format': FORMAT,
+        'source': path.name,
+        'stamp': stat_stamp(path.stat()),
+        'rows': len(hours),
+        'start': int(hours[0]) if len(hours) else None,
+        'end': int(hours[-1]) if len(hours) else None,
+    }
+
+# One-time conversion of every series CSV in data_path. Files whose manifest entry
+# still matches the CSV's mtime and size are skipped.
+def ingest(data_path=DATA_PATH, store_path=STORE_PATH, force=False):
+    data_path, store_path = Path(data_path), Path(store_path)
+    store_path.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(store_path)
+
+    converted = 0
+    for name in sorted(os.listdir(data_path)):
+        match = SERIES_FILE.match(name)
+        if not match:
+            continue
+        path = data_path / name
+        entry = manifest.get(path.stem)
+        if not force and entry and entry.get('format') == FORMAT and entry['stamp'] == stat_stamp(path.stat()):
+            continue
+        try:
+            manifest[path.stem] = ingest_file(path, store_path)
+            converted += 1
+        except Exception as e:
+            print(f"Error while processing file {path}: {e}")
+
+    write_manifest(store_path, manifest)
+    return converted
+
+def read_manifest(store_path):
+    try:
+        with open(Path(store_path) / MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def write_manifest(store_path, manifest):
+    # Write then rename so readers never see a half-written manifest
+    tmp = Path(store_path) / (MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, Path(store_path) / MANIFEST)
+
+
+class SeriesStore:
+    # Read side of the binary store. Arrays are memory-mapped, so every gunicorn
+    # worker shares the same page-cache copy instead of parsing its own.
+
+    def __init__(self, store_path=STORE_PATH):
+        self.store_path = Path(store_path)
+        self._manifest = None
+        self._manifest_stamp = None
+        self._lock = threading.Lock()
+
+    # The manifest is re-read whenever the file's mtime or size changes, so running
+    # workers pick up a re-ingest (e.g. conv.py --store) without a restart
+    @property
+    def manifest(self):
+        try:
+            stamp = stat_stamp(os.stat(self.store_path / MANIFEST))
+        except FileNotFoundError:
+            stamp = None
+        with self._lock:
+            if self._manifest is None or self._manifest_stamp != stamp:
+                self._manifest, self._manifest_stamp = read_manifest(self.store_path), stamp
+            return self._manifest
+
+    def reload(self):
+        with self._lock:
+            self._manifest = None
+
+    # Manifest entry of a series if it can be served: written by the current FORMAT and
+    # converted from the CSV as it is now (stamp is [mtime_ns, size] of the CSV)
+    def _current(self, stem, stamp):
+        entry = self.manifest.get(stem)
+        if entry is None or entry.get('format') != FORMAT or entry['stamp'] != list(stamp):
+            return None
+        return entry
+
+    # Returns SeriesData for the series, or None when it was never ingested, was
+    # ingested by an older format, or the CSV changed since
+    def open(self, stem, stamp):
+        if self._current(stem, stamp) is None:
+            return None
+        try:
+            hours = np.load(self.store_path / f"{stem}.hours.npy", mmap_mode='r')
+            values = np.load(self.store_path / f"{stem}.values.npy", mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            return None
+        times = hours.view('datetime64[h]')
+        return SeriesData(times, month_day(times), values)
+
+    # Returns the precomputed aggregation pyramid, or None when it is missing or stale
+    def open_pyramid(self, stem, stamp):
+        if self._current(stem, stamp) is None:
+            return None
+        try:
+            with np.load(self.store_path / f"{stem}.pyramid.npz") as arrays:
+                return unpack_pyramid(arrays)
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert station CSV files into the memory-mapped series store.")
+    parser.add_argument('--data', default=str(DATA_PATH), help="directory holding the {location}{yy}_{code}.csv files")
+    parser.add_argument('--out', default=str(STORE_PATH), help="directory to write the binary store to")
+    parser.add_argument('--force', action='store_true', help="re-convert files even if they are unchanged")
+    args = parser.parse_args()
+
+    converted = ingest(args.data, args.out, force=args.force)
+    print(f"Converted {converted} series into {args.out}")
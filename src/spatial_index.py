@@ -0,0 +1,221 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from event_store import EventStore
+
+# Approximate coordinates (latitude, longitude) of the town or village each monitoring
+# station is named after. Good to a few km, which is well inside any search radius.
+STATION_COORDINATES = {
+    'ACHU': (40.735, 43.770),  # Akhurik
+    'AMAS': (40.955, 43.787),  # Amasia
+    'ARAR': (39.830, 44.700),  # Ararat
+    'ARTA': (39.954, 44.551),  # Artashat
+    'ARTK': (40.617, 43.976),  # Artik
+    'ARUC': (40.287, 44.088),  # Aruch
+    'ASHO': (41.036, 43.858),  # Ashotsk
+    'AZAT': (40.720, 43.825),  # Azatan
+    'BAVR': (41.015, 43.800),  # Bavra
+    'DZOR': (40.205, 44.640),  # Dzorakhbyur
+    'EKHG': (39.761, 45.333),  # Yeghegnadzor
+    'GARN': (40.119, 44.730),  # Garni
+    'GORS': (39.511, 46.341),  # Goris
+    'HOVT': (40.985, 43.920),  # Hovit
+    'IJEV': (40.876, 45.149),  # Ijevan
+    'JERM': (39.841, 45.669),  # Jermuk
+    'KADJ': (39.151, 46.160),  # Kajaran
+    'KARC': (40.170, 45.575),  # Karchaghbyur
+    'KOXB': (41.165, 45.010),  # Koghb
+    'KUCH': (40.525, 44.345),  # Kuchak
+    'MARD': (40.213, 46.815),  # Martakert
+    'METS': (40.144, 44.116),  # Metsamor
+    'NOEM': (41.172, 44.999),  # Noyemberyan
+    'PARA': (40.160, 44.410),  # Parakar
+    'SART': (40.870, 44.250),  # Saratovka
+    'SEVN': (40.548, 44.953),  # Sevan
+    'SHIR': (40.853, 44.147),  # Shirakamut
+    'SISN': (39.521, 46.032),  # Sisian
+    'STEP': (41.009, 44.384),  # Stepanavan
+    'STIP': (39.815, 46.752),  # Stepanakert
+    'SURN': (39.794, 44.782),  # Surenavan
+    'TSOV': (40.630, 44.957),  # Tsovagyugh
+    'VANA': (40.812, 44.488),  # Vanadzor
+    'VARD': (40.183, 45.730),  # Vardenis
+}
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0
+
+# Side of a grid cell in degrees. 0.5° is about 55 km north-south, so a regional search
+# touches a handful of cells.
+CELL_DEGREES = 0.5
+
+# Default search radius around a station
+RADIUS_KM = 100.0
+
+
+# Great-circle distance in km; every argument may be an array (degrees)
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    phi1, phi2 = np.radians(latitude1), np.radians(latitude2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(longitude2) - np.asarray(longitude1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+# A query bound as datetime64[s] (UTC, like the stored event times), or None
+def to_datetime64(value):
+    if value is None:
+        return None
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_convert('UTC').tz_localize(None)
+    return np.datetime64(stamp, 's')
+
+
+class GridIndex:
+    # Events bucketed into a uniform latitude/longitude grid. The events are stored sorted
+    # by (cell, time), so every cell is one contiguous slice and a time window within a
+    # cell is found with two binary searches. A radius query only computes distances for
+    # the events of the cells overlapping the circle's bounding box.
+
+    def __init__(self, times, latitudes, longitudes, magnitudes, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        times = np.asarray(times, dtype='datetime64[s]')
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        rows, columns = self._cell(latitudes, longitudes)
+        order = np.lexsort((times, columns, rows))
+        self.times = times[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.magnitudes = np.asarray(magnitudes, dtype=np.float64)[order]
+        # Position of every event in the arrays as given
+        self.positions = order
+
+        cells = np.stack([rows[order], columns[order]], axis=1)
+        starts = np.flatnonzero(np.r_[True, np.any(cells[1:] != cells[:-1], axis=1)]) if len(cells) else []
+        stops = np.r_[starts[1:], len(cells)]
+        self._slices = {(int(cells[i, 0]), int(cells[i, 1])): (int(i), int(j)) for i, j in zip(starts, stops)}
+
+    def __len__(self):
+        return len(self.times)
+
+    def _cell(self, latitudes, longitudes):
+        return (np.floor(np.asarray(latitudes) / self.cell_degrees).astype(np.int64),
+                np.floor(np.asarray(longitudes) / self.cell_degrees).astype(np.int64))
+
+    # Positions (into this index's arrays) of the events in the cells a circle can reach
+    # that fall in start <= time < end
+    def _candidates(self, latitude, longitude, radius_km, start, end):
+        dlat = radius_km / KM_PER_DEGREE
+        # Longitude degrees shrink towards the poles; use the circle's widest latitude
+        widest = min(abs(latitude) + dlat, 89.9)
+        dlon = min(radius_km / (KM_PER_DEGREE * np.cos(np.radians(widest))), 180.0)
+        row0, col0 = self._cell(latitude - dlat, longitude - dlon)
+        row1, col1 = self._cell(latitude + dlat, longitude + dlon)
+
+        ranges = []
+        for row in range(int(row0), int(row1) + 1):
+            for column in range(int(col0), int(col1) + 1):
+                found = self._slices.get((row, column))
+                if found is None:
+                    continue
+                i, j = found
+                lo = i if start is None else i + int(np.searchsorted(self.times[i:j], start))
+                hi = j if end is None else i + int(np.searchsorted(self.times[i:j], end))
+                if lo < hi:
+                    ranges.append(np.arange(lo, hi))
+        return np.concatenate(ranges) if ranges else np.array([], dtype=np.int64)
+
+    # Events within radius_km of a point with start <= time < end and magnitude >=
+    # min_magnitude (each bound optional). Returns (positions into the arrays the index
+    # was built from, distances in km), oldest first.
+    def within(self, latitude, longitude, radius_km, start=None, end=None, min_magnitude=None):
+        candidates = self._candidates(latitude, longitude, radius_km, to_datetime64(start), to_datetime64(end))
+        if min_magnitude is not None:
+            candidates = candidates[self.magnitudes[candidates] >= min_magnitude]
+        distances = haversine_km(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+        near = distances <= radius_km
+        candidates, distances = candidates[near], distances[near]
+        order = np.argsort(self.times[candidates], kind='stable')
+        return self.positions[candidates[order]], distances[order]
+
+
+class EventTimeline:
+    # Events near one station in time order. The events of a plotted range are one slice,
+    # found with two binary searches, so a lookup costs O(log n + k) however long the
+    # catalog is.
+
+    def __init__(self, events):
+        self.events = events
+        self.times = events['datetime'].to_numpy()
+
+    def __len__(self):
+        return len(self.times)
+
+    # Events with start <= time <= end
+    def between(self, start, end):
+        i = np.searchsorted(self.times, to_datetime64(start), side='left')
+        j = np.searchsorted(self.times, to_datetime64(end), side='right')
+        return self.events.iloc[i:j]
+
+
+class EventIndex:
+    # Spatial index over earthquakes.db for station queries such as "events within R km
+    # of ARTA between t0 and t1 above M". The grid is built once per table version
+    # (the newest row id) and kept per worker; a query then costs a few binary searches
+    # and one vectorized haversine over the candidate cells.
+
+    def __init__(self, store=None, cell_degrees=CELL_DEGREES):
+        self.store = store if store is not None else EventStore()
+        self.cell_degrees = cell_degrees
+        self._grid = None
+        self._timelines = {}
+        self._lock = threading.Lock()
+
+    # (events, grid) for the current table contents; events are the store's arrays
+    def grid(self):
+        version = self.store.last_id()
+        with self._lock:
+            cached = self._grid
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        events = self.store.arrays()
+        grid = GridIndex(events['datetime'], events['latitude'], events['longitude'], events['magnitude'],
+                         self.cell_degrees)
+        with self._lock:
+            self._grid = (version, events, grid)
+        return events, grid
+
+    # Events around a point: a frame of datetime, latitude, longitude, magnitude and
+    # distance_km, oldest first
+    def near(self, latitude, longitude, radius_km=RADIUS_KM, start=None, end=None, min_magnitude=None):
+        events, grid = self.grid()
+        positions, distances = grid.within(latitude, longitude, radius_km, start, end, min_magnitude)
+        return pd.DataFrame({
+            'datetime': events['datetime'][positions].astype('datetime64[ns]'),
+            'latitude': events['latitude'][positions],
+            'longitude': events['longitude'][positions],
+            'magnitude': events['magnitude'][positions],
+            'distance_km': distances,
+        })
+
+    # Events around a monitoring station; unknown stations raise KeyError
+    def near_station(self, location, radius_km=RADIUS_KM, start=None, end=None, min_magnitude=None):
+        latitude, longitude = STATION_COORDINATES[location]
+        return self.near(latitude, longitude, radius_km, start, end, min_magnitude)
+
+    # Time-sorted events around a station, kept until the table changes. Used to mark
+    # earthquakes on the station graphs.
+    def timeline(self, location, radius_km=RADIUS_KM, min_magnitude=None):
+        key = (location, radius_km, min_magnitude)
+        version = self.store.last_id()
+        with self._lock:
+            cached = self._timelines.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        timeline = EventTimeline(self.near_station(location, radius_km, min_magnitude=min_magnitude))
+        with self._lock:
+            self._timelines[key] = (version, timeline)
+        return timeline
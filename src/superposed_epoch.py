@@ -0,0 +1,124 @@
+from collections import namedtuple
+
+import numpy as np
+
+from correlation import station_readings
+from figure_cache import VersionedCache
+from spatial_index import RADIUS_KM, STATION_COORDINATES
+
+# Window around each event, in days before and after it
+BEFORE_DAYS = 30
+AFTER_DAYS = 10
+
+# Two-sided 95% interval of the stacked mean
+CONFIDENCE_Z = 1.96
+
+# Stacked response at every hourly offset. offsets are in days relative to the event;
+# mean/lower/upper are the mean and its confidence band over the windows with a reading
+# at that offset, count how many there are. windows is the number of (series, event)
+# windows with at least one reading.
+EpochStack = namedtuple('EpochStack', ['offsets', 'mean', 'lower', 'upper', 'count', 'windows'])
+
+
+# A series on a dense hourly grid: (first hour as epoch hours, values with NaN for missing
+# hours). Repeated hours keep the last reading.
+def hourly_grid(times, values):
+    hours = np.asarray(times).astype('datetime64[h]').astype(np.int64)
+    if not len(hours):
+        return 0, np.array([], dtype=np.float64)
+    start = hours.min()
+    grid = np.full(hours.max() - start + 1, np.nan)
+    grid[hours - start] = values
+    return int(start), grid
+
+# Cut the window [event - before, event + after] hours out of every grid around each of
+# its events. All grids are laid end to end in one NaN-padded buffer, so every window of
+# every series is gathered with a single fancy-indexing pass. grids is a list of
+# (start, values); events the matching list of event times in epoch hours. Returns the
+# (windows x before + after + 1) matrix and, per row, the index of its grid.
+def gather_windows(grids, events, before, after):
+    pad = before + after
+    pieces, positions, owners = [], [], []
+    offset = 0
+    for index, ((start, values), hours) in enumerate(zip(grids, events)):
+        relative = np.asarray(hours, dtype=np.int64) - start
+        # Events whose window misses the series entirely contribute nothing
+        relative = relative[(relative >= -after) & (relative < len(values) + before)]
+        pieces += [np.full(pad, np.nan), values, np.full(pad, np.nan)]
+        positions.append(offset + pad + relative - before)
+        owners.append(np.full(len(relative), index))
+        offset += len(values) + 2 * pad
+    if not pieces:
+        return np.empty((0, pad + 1)), np.array([], dtype=np.int64)
+    buffer = np.concatenate(pieces)
+    positions = np.concatenate(positions)
+    matrix = buffer[positions[:, None] + np.arange(pad + 1)]
+    return matrix, np.concatenate(owners)
+
+# Mean and confidence band of the windows at every offset, ignoring missing readings.
+# The matrix is used as scratch space: with hundreds of events x dozens of stations it is
+# large enough that temporary copies would cost more than the arithmetic.
+def stack_windows(matrix, before):
+    present = ~np.isnan(matrix)
+    count = present.sum(axis=0)
+    windows = int(present.any(axis=1).sum())
+    np.nan_to_num(matrix, copy=False)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = matrix.sum(axis=0) / count
+        matrix -= mean
+        matrix *= present
+        variance = np.einsum('ij,ij->j', matrix, matrix) / (count - 1)
+        margin = CONFIDENCE_Z * np.sqrt(variance / count)
+    mean = np.where(count > 0, mean, np.nan)
+    margin = np.where(count > 1, margin, np.nan)
+    offsets = (np.arange(matrix.shape[1]) - before) / 24
+    return EpochStack(offsets, mean, mean - margin, mean + margin, count, windows)
+
+# Express every window relative to its own pre-event mean, in units of its series'
+# standard deviation, so stations with different units and levels can be stacked. Windows
+# without a reading before the event become all NaN. Works in place.
+def normalize_windows(matrix, owners, scales, before):
+    pre = matrix[:, :before]
+    present = ~np.isnan(pre)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        baseline = np.where(present, pre, 0.0).sum(axis=1) / present.sum(axis=1)
+        matrix -= baseline[:, None]
+        matrix /= scales[owners, None]
+    return matrix
+
+
+class EpochStacker:
+    # Superposed-epoch analysis: the mean response of station series around earthquake
+    # times. Each series is stacked around the events within radius_km of its station.
+    # Results are kept per worker until a station file or the event table changes.
+    # Series are (location, code) pairs.
+
+    def __init__(self, cache, event_index, maxsize=32):
+        self.cache = cache
+        self.event_index = event_index
+        self._results = VersionedCache(maxsize)
+
+    # Stack every series in `series` around its station's events with magnitude >=
+    # min_magnitude. With normalize, windows are stacked as deviations from their
+    # pre-event mean in standard deviations of the series; otherwise as raw values.
+    def stack(self, series, radius_km=RADIUS_KM, min_magnitude=None, before_days=BEFORE_DAYS,
+              after_days=AFTER_DAYS, normalize=True):
+        series = [s for s in series if s[0] in STATION_COORDINATES]
+        version = (tuple(self.cache.version(*s) for s in series), self.event_index.store.last_id())
+        key = (tuple(series), radius_km, min_magnitude, before_days, after_days, normalize)
+        return self._results.get(key, version, lambda: self._build(
+            series, radius_km, min_magnitude, before_days * 24, after_days * 24, normalize))
+
+    def _build(self, series, radius_km, min_magnitude, before, after, normalize):
+        grids, events, scales = [], [], []
+        for location, code in series:
+            times, values = station_readings(self.cache, location, code)
+            grids.append(hourly_grid(times, values))
+            timeline = self.event_index.timeline(location, radius_km, min_magnitude)
+            events.append(timeline.times.astype('datetime64[h]').astype(np.int64))
+            scales.append(np.nanstd(values) if np.isfinite(values).any() else np.nan)
+
+        matrix, owners = gather_windows(grids, events, before, after)
+        if normalize:
+            matrix = normalize_windows(matrix, owners, np.asarray(scales, dtype=np.float64), before)
+        return stack_windows(matrix, before)
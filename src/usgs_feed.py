@@ -0,0 +1,131 @@
+import email.utils
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+
+# Every event of the past day; the feed is regenerated about once a minute
+FEED_URL = os.environ.get('USGS_FEED_URL', "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_day.geojson")
+
+# Seconds between polls, and the most a single request may take
+POLL_INTERVAL = 300.0
+REQUEST_TIMEOUT = 10.0
+
+
+# Local path of a feed given as a path or a file:// URL, or None for an HTTP feed
+def local_path(url):
+    parsed = urlparse(str(url))
+    if parsed.scheme == 'file':
+        return url2pathname(parsed.path)
+    if parsed.scheme in ('http', 'https'):
+        return None
+    return str(url)
+
+# The fields the dashboards use from one GeoJSON feature
+def parse_feature(feature):
+    properties = feature.get('properties') or {}
+    # A feature may come without a geometry or with null coordinates
+    coordinates = list((feature.get('geometry') or {}).get('coordinates') or [])
+    longitude, latitude = (coordinates + [None, None])[:2]
+    return {
+        'event_id': feature.get('id'),
+        'latitude': latitude,
+        'longitude': longitude,
+        'date_time': properties.get('time'),  # epoch milliseconds
+        'magnitude': properties.get('mag'),
+        'intensity': None if properties.get('mmi') is None else str(properties['mmi']),
+        'place': properties.get('place'),
+    }
+
+
+class FeedPoller:
+    # Fetches the USGS feed in the background and keeps its parsed features in memory, so
+    # callbacks read them without touching the network. Requests are conditional
+    # (ETag/If-Modified-Since), so an unchanged feed costs a 304 and no parsing. New
+    # events are saved to the event store without duplicates. The feed may also be a local
+    # file (a path or file:// URL), which is re-read only when its mtime or size changes.
+
+    def __init__(self, url=FEED_URL, store=None, interval=POLL_INTERVAL, timeout=REQUEST_TIMEOUT):
+        self.url = url
+        self.store = store
+        self.interval = interval
+        self.timeout = timeout
+        self.features = []
+        self.updated = None
+        self._validators = {}
+        self._session = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    # Fetch once. Returns True when the feed changed since the last poll. The validators
+    # of a response are only kept once its events are saved, so a feed whose insert failed
+    # is fetched and saved again on the next poll instead of being answered with a 304.
+    def poll(self):
+        path = local_path(self.url)
+        payload, validators = self._read_file(path) if path is not None else self._fetch()
+        if payload is None:
+            return False
+        features = [parse_feature(f) for f in payload.get('features', [])]
+        features = [f for f in features if None not in (f['latitude'], f['longitude'], f['date_time'], f['magnitude'])]
+        # Readers see either the old or the new list, never a half-built one
+        self.features, self.updated = features, time.time()
+        if self.store is not None:
+            self.store.insert_new(features)
+        self._validators = validators
+        return True
+
+    # (payload, validators) of the feed, or (None, None) when it did not change
+
+    def _fetch(self):
+        if self._session is None:
+            self._session = requests.Session()
+        headers = {}
+        if 'etag' in self._validators:
+            headers['If-None-Match'] = self._validators['etag']
+        if 'last_modified' in self._validators:
+            headers['If-Modified-Since'] = self._validators['last_modified']
+        response = self._session.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None, None
+        response.raise_for_status()
+        validators = {name: response.headers[header] for name, header in
+                      (('etag', 'ETag'), ('last_modified', 'Last-Modified')) if header in response.headers}
+        return response.json(), validators
+
+    def _read_file(self, path):
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if self._validators.get('stamp') == stamp:
+            return None, None
+        with open(path) as f:
+            payload = json.load(f)
+        return payload, {'stamp': stamp, 'last_modified': email.utils.formatdate(st.st_mtime, usegmt=True)}
+
+    # Poll now and then every `interval` seconds on a daemon thread. The thread is
+    # restarted in every forked gunicorn worker.
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        os.register_at_fork(after_in_child=self._spawn)
+        self._spawn()
+
+    def _spawn(self):
+        # A session must not be shared with the parent process
+        self._session = None
+        threading.Thread(target=self._run, name='usgs-feed', daemon=True).start()
+
+    def _run(self):
+        while True:
+            # Network and parse errors, but also a locked or broken database or a malformed
+            # feature, must not end the thread; the next poll tries again
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error while polling {self.url}: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly import MAD_SCALE, AnomalyEngine, score, seasonal_baseline
+from catalog import Catalog
+from series_cache import SeriesCache, load_series
+
+
+def hourly_series(start, hours, seed):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=hours, freq='h').to_numpy()
+    t = np.arange(hours)
+    values = 100 + 10 * np.sin(2 * np.pi * t / (24 * 365)) + 3 * np.sin(2 * np.pi * t / 24) + rng.normal(size=hours)
+    values[rng.random(hours) < 0.1] = np.nan
+    return times, values
+
+
+# Median and scaled MAD of the readings at this hour of day within season_days of this day
+# of year (wrapping around the 366-day grid), the slow way
+def brute_force_cell(times, values, day, hour, season_days, min_readings):
+    stamps = pd.DatetimeIndex(times)
+    present = ~np.isnan(values)
+    distance = np.abs(stamps.dayofyear.to_numpy() - 1 - day)
+    distance = np.minimum(distance, 366 - distance)
+    pooled = values[present & (stamps.hour.to_numpy() == hour) & (distance <= season_days)]
+    if len(pooled) < min_readings:
+        return np.nan, np.nan
+    median = np.median(pooled)
+    scale = MAD_SCALE * np.median(np.abs(pooled - median))
+    return median, (scale if scale > 0 else np.nan)
+
+
+def test_baseline_matches_brute_force():
+    times, values = hourly_series('2021-01-01', 24 * 365 * 2, 19)
+    baseline = seasonal_baseline(times, values, season_days=15, min_readings=10)
+    rng = np.random.default_rng(0)
+    cells = [(0, 0), (365, 23), (364, 5), (59, 12)] + list(zip(rng.integers(0, 366, 60), rng.integers(0, 24, 60)))
+    for day, hour in cells:
+        median, scale = brute_force_cell(times, values, day, hour, 15, 10)
+        np.testing.assert_allclose([baseline.median[day, hour], baseline.scale[day, hour]], [median, scale],
+                                   equal_nan=True, err_msg=f"day {day} hour {hour}")
+
+
+def test_sparse_and_empty_baselines_are_blank():
+    times, values = hourly_series('2021-06-01', 24 * 5, 1)
+    baseline = seasonal_baseline(times, values, min_readings=10)
+    assert np.isnan(baseline.median).all() and np.isnan(baseline.scale).all()
+    empty = seasonal_baseline(np.array([], dtype='datetime64[h]'), np.array([]))
+    assert empty.median.shape == (366, 24) and np.isnan(empty.median).all()
+
+
+def test_score():
+    times, values = hourly_series('2021-01-01', 24 * 365, 3)
+    baseline = seasonal_baseline(times, values)
+    z = score(baseline, times[:48], values[:48])
+    np.testing.assert_allclose(z[0], (values[0] - baseline.median[0, 0]) / baseline.scale[0, 0])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    times, values = hourly_series('2021-01-01', 24 * 365, 5)
+    values[-5], values[1000] = 300.0, -100.0
+    pd.DataFrame({
+        'date': pd.DatetimeIndex(times).strftime('%m/%d/%y'),
+        'hour': pd.DatetimeIndex(times).strftime('%H:%M'),
+        'value': np.round(values, 3),
+    }).to_csv(tmp_path / 'SHIR21_WAT.csv', index=False)
+    catalog = Catalog(tmp_path)
+    return AnomalyEngine(SeriesCache(tmp_path, load_series, catalog=catalog), catalog), times
+
+
+def test_flags_and_scan_find_the_spikes(engine):
+    engine, times = engine
+    flags = engine.flags('SHIR', 'WAT')
+    assert (flags['z'].abs() > 4).all()
+    largest = flags.loc[flags['z'].abs().nlargest(2).index].sort_values('datetime')
+    assert largest['datetime'].tolist() == [pd.Timestamp(times[1000]), pd.Timestamp(times[-5])]
+    assert largest['z'].iloc[0] < -20 and largest['z'].iloc[1] > 20
+
+    # Only the newest readings are scanned
+    scanned = engine.scan()
+    assert scanned[['location', 'code']].values.tolist() == [['SHIR', 'WAT']]
+    assert scanned['datetime'].tolist() == [pd.Timestamp(times[-5])]
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import comparison
+from catalog import Catalog
+from comparison import ComparisonService
+from figure_cache import VersionedCache
+from series_cache import SeriesCache, load_series
+
+
+def write_series(path, hours, shift=0):
+    times = pd.date_range('2021-01-01', periods=hours, freq='h')
+    pd.DataFrame({
+        'date': times.strftime('%m/%d/%y'),
+        'hour': times.strftime('%H:%M'),
+        'value': np.round(np.sin((np.arange(hours) - shift) / 12), 4),
+    }).to_csv(path, index=False)
+
+
+@pytest.fixture
+def service(tmp_path):
+    write_series(tmp_path / 'SHIR21_WAT.csv', 24 * 30)
+    write_series(tmp_path / 'ARTK21_WAT.csv', 24 * 30, shift=5)
+    return ComparisonService(SeriesCache(tmp_path, load_series, catalog=Catalog(tmp_path)))
+
+
+def test_lag_ranges_share_one_alignment(service, monkeypatch):
+    calls = []
+    align = comparison.align
+    monkeypatch.setattr(comparison, 'align', lambda *args: calls.append(1) or align(*args))
+    wide = service.compare(('SHIR', 'WAT'), ('ARTK', 'WAT'), 21, 72)
+    narrow = service.compare(('SHIR', 'WAT'), ('ARTK', 'WAT'), 21, 24)
+    assert len(calls) == 1
+    assert len(wide.lags) == 145 and len(narrow.lags) == 49
+    assert narrow.lags[np.nanargmax(narrow.lag_r)] == 5
+    assert service.compare(('SHIR', 'WAT'), ('ARTK', 'WAT'), 21, 72) is wide
+
+
+def test_versioned_cache_is_bounded_and_versioned():
+    cache = VersionedCache(maxsize=2)
+    assert cache.get('a', 1, lambda: 'a1') == 'a1'
+    assert cache.get('a', 1, lambda: 'rebuilt') == 'a1'
+    assert cache.get('a', 2, lambda: 'a2') == 'a2'
+    cache.get('b', 1, lambda: 'b1')
+    cache.get('c', 1, lambda: 'c1')
+    assert cache.get('a', 2, lambda: 'evicted') == 'evicted'
+    assert cache.get('c', 1, lambda: 'rebuilt') == 'c1'
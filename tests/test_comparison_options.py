@@ -0,0 +1,33 @@
+import pytest
+from dash import no_update
+from dash.exceptions import PreventUpdate
+
+import app
+
+
+def test_defaults_on_first_open():
+    options, first, _, second, year_options, year = app.set_comparison_options('comparison')
+    assert first == options[0]['value']
+    assert second.endswith('_RAD')
+    assert year in [o['value'] for o in year_options]
+
+
+def test_choices_survive_reopening_the_tab():
+    options, _, _, _, year_options, _ = app.set_comparison_options('comparison')
+    first, second, year = options[-1]['value'], options[1]['value'], year_options[1]['value']
+    result = app.set_comparison_options('comparison', first, second, year)
+    assert result[1] is no_update and result[3] is no_update and result[5] is no_update
+    assert app.set_comparison_options('comparison', first, second, 'all')[5] is no_update
+
+
+def test_choices_no_longer_offered_fall_back_to_defaults():
+    options, first, _, _, _, year = app.set_comparison_options('comparison')
+    result = app.set_comparison_options('comparison', 'GONE_WAT', options[0]['value'], 99)
+    assert result[1] == first
+    assert result[3] is no_update
+    assert result[5] == year
+
+
+def test_other_tabs_leave_the_controls_alone():
+    with pytest.raises(PreventUpdate):
+        app.set_comparison_options('series', 'SHIR_WAT', 'SHIR_RAD', 'all')
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data.conv import convert_file, process_rad_file, write_series_csv
+from loader import read_frame
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'ARTK21.RAD'
+
+
+def test_process_rad_file_keeps_leading_and_trailing_blanks():
+    df = process_rad_file(FIXTURE)
+    assert df['datetime'].dt.strftime('%Y-%m-%d %H:%M').tolist() == [
+        '2021-01-01 00:00', '2021-01-01 01:00', '2021-01-01 02:00', '2021-01-01 03:00',
+        '2021-01-02 00:00', '2021-01-02 01:00', '2021-01-02 02:00', '2021-01-02 03:00',
+    ]
+    np.testing.assert_array_equal(df['value'], [123, 456, np.nan, 789, np.nan, 234, 345, np.nan])
+
+
+def test_write_series_csv(tmp_path):
+    path = tmp_path / 'ARTK21_RAD.csv'
+    write_series_csv(process_rad_file(FIXTURE), path)
+    assert path.read_text().splitlines()[:6] == [
+        'date,hour,value', '01/01/21,00:00,123', '01/01/21,01:00,456', '01/01/21,02:00,',
+        '01/01/21,03:00,789', '01/02/21,00:00,',
+    ]
+    df = read_frame(path)
+    assert df['datetime'].iloc[-1] == pd.Timestamp('2021-01-02 03:00')
+    assert df['value'].isna().sum() == 3
+
+
+def test_file_without_dated_lines_is_skipped(tmp_path):
+    source = tmp_path / 'ARTK22.RAD'
+    source.write_text('ARTK 2022 RADON\n')
+    assert convert_file(source, tmp_path) is None
+    assert not (tmp_path / 'ARTK22_RAD.csv').exists()
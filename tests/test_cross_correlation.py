@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from cross_correlation import cross_correlation
+
+
+# Pearson correlation of a[t] with b[t + lag] over the hours both have a reading
+def brute_force(a, b, max_lag, min_periods):
+    n = len(a)
+    result = []
+    for lag in range(-max_lag, max_lag + 1):
+        x = a[max(0, -lag):n - max(0, lag)]
+        y = b[max(0, lag):n - max(0, -lag)]
+        both = ~(np.isnan(x) | np.isnan(y))
+        if both.sum() < min_periods or np.std(x[both]) == 0 or np.std(y[both]) == 0:
+            result.append(np.nan)
+        else:
+            result.append(np.corrcoef(x[both], y[both])[0, 1])
+    return np.array(result)
+
+
+@pytest.mark.parametrize('n, max_lag', [(500, 72), (100, 99), (40, 60)])
+def test_matches_brute_force(n, max_lag):
+    rng = np.random.default_rng(n)
+    a = np.cumsum(rng.normal(size=n)) + 1000
+    b = np.roll(a, 7) + rng.normal(scale=0.5, size=n)
+    a[rng.random(n) < 0.2] = np.nan
+    b[rng.random(n) < 0.2] = np.nan
+
+    lags, r = cross_correlation(a, b, max_lag, min_periods=10)
+    max_lag = min(max_lag, n - 1)
+    np.testing.assert_array_equal(lags, np.arange(-max_lag, max_lag + 1))
+    np.testing.assert_allclose(r, brute_force(a, b, max_lag, 10), atol=1e-9, equal_nan=True)
+
+
+def test_empty_and_constant_series():
+    lags, r = cross_correlation([], [], 5)
+    assert len(lags) == 1 and np.isnan(r).all()
+    _, r = cross_correlation(np.ones(50), np.arange(50.0), 3, min_periods=2)
+    assert np.isnan(r).all()
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+import pytest
+
+from downsample import downsample, lttb, minmax
+
+
+# Sveinn Steinarsson's reference LTTB, point by point
+def reference_lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    a, sampled = 0, [0]
+    for i in range(threshold - 2):
+        avg_start = int(math.floor((i + 1) * every) + 1)
+        avg_end = min(int(math.floor((i + 2) * every) + 1), n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        range_offs = int(math.floor(i * every) + 1)
+        range_to = int(math.floor((i + 1) * every) + 1)
+        max_area, next_a = -1.0, range_offs
+        for j in range(range_offs, range_to):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a])) * 0.5
+            if area > max_area:
+                max_area, next_a = area, j
+        sampled.append(next_a)
+        a = next_a
+    sampled.append(n - 1)
+    return sampled
+
+
+@pytest.mark.parametrize('n, n_out', [(10000, 1200), (5000, 7), (1000, 999), (997, 100), (50, 3)])
+def test_lttb_matches_reference(n, n_out):
+    rng = np.random.default_rng(n + n_out)
+    x = np.cumsum(rng.uniform(0.5, 1.5, n))
+    y = np.cumsum(rng.normal(size=n))
+    assert lttb(x, y, n_out).tolist() == reference_lttb(x.tolist(), y.tolist(), n_out)
+
+
+def test_lttb_keeps_short_series():
+    assert lttb(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_minmax_keeps_every_spike():
+    rng = np.random.default_rng(4)
+    y = rng.normal(size=10000)
+    spikes = [17, 5003, 9999]
+    y[spikes] = [50, -50, 60]
+    kept = minmax(y, 200)
+    assert len(kept) <= 200 and set(spikes) <= set(kept.tolist())
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_downsample_skips_gaps_and_datetimes():
+    times = np.arange('2021-01-01', '2021-03-01', dtype='datetime64[h]')
+    y = np.sin(np.arange(len(times)) / 50)
+    y[::7] = np.nan
+    for method in ('lttb', 'minmax'):
+        kept = downsample(times, y, method, 300)
+        assert len(kept) <= 300 and not np.isnan(y[kept]).any()
+    with pytest.raises(ValueError):
+        downsample(times, y, 'every')
@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from event_store import EventStore
+
+EVENT = {'latitude': 40.1, 'longitude': 44.5, 'date_time': 1691452800000, 'magnitude': 4.2, 'intensity': None}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(tmp_path / 'earthquakes.db')
+    yield store
+    store.close()
+
+
+def test_repeated_feed_event_is_stored_once(store):
+    assert store.insert_new([dict(EVENT, event_id='us1')]) == 1
+    assert store.insert_new([dict(EVENT, event_id='us1')]) == 0
+    assert store.count() == 1
+
+
+def test_revised_event_replaces_the_stored_row(store):
+    store.insert_new([dict(EVENT, event_id='us1')])
+    version = store.last_id()
+    assert store.insert_new([dict(EVENT, event_id='us1', magnitude=4.3, latitude=40.2)]) == 1
+    events = store.window()
+    assert [(e.event_id, e.magnitude, e.latitude) for e in events] == [('us1', 4.3, 40.2)]
+    # Indexes built from the table notice the revision
+    assert store.last_id() != version
+
+
+def test_events_without_id_are_matched_on_their_fields(store):
+    assert store.insert_new([EVENT, EVENT]) == 1
+    assert store.insert_new([dict(EVENT, magnitude=5.0)]) == 1
+    assert store.count() == 2
+
+
+def test_rows_saved_before_ids_take_the_feed_id(store):
+    store.insert_new([EVENT])
+    assert store.insert_new([dict(EVENT, event_id='us1')]) == 0
+    assert [e.event_id for e in store.window()] == ['us1']
+
+
+def test_older_table_gets_the_event_id_column(tmp_path):
+    path = tmp_path / 'old.db'
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE earthquakes (id INTEGER PRIMARY KEY AUTOINCREMENT, latitude REAL, '
+                     'longitude REAL, date_time TEXT, magnitude REAL, intensity TEXT)')
+        conn.execute("INSERT INTO earthquakes (latitude, longitude, date_time, magnitude, intensity) "
+                     "VALUES (40.15, 45.0, '2023.08.08', 7.0, '5-6')")
+    conn.close()
+    store = EventStore(path)
+    assert store.insert_new([dict(EVENT, event_id='us1'), dict(EVENT, event_id='us1')]) == 1
+    assert sorted((e.id, e.date_time, e.event_id) for e in store.window()) == [(1, '2023-08-08 00:00:00', None),
+                                                                              (2, '2023-08-08 00:00:00', 'us1')]
+    store.close()
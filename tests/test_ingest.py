@@ -0,0 +1,44 @@
+import pytest
+
+import app
+from catalog import Catalog
+from series_cache import SeriesCache, load_series
+
+TOKEN = 'test-token'
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    (tmp_path / 'SHIR22_WAT.csv').write_text('date,hour,value\n06/01/22,12:00,-40.1\n')
+    catalog = Catalog(tmp_path)
+    monkeypatch.setattr(app, 'catalog', catalog)
+    monkeypatch.setattr(app, 'series_cache', SeriesCache(tmp_path, load_series, catalog=catalog))
+    monkeypatch.setattr(app, 'INGEST_TOKEN', TOKEN)
+    return app.server.test_client()
+
+
+def post(client, readings):
+    return client.post('/api/readings/SHIR/WAT', json={'readings': readings}, headers={'X-Ingest-Token': TOKEN})
+
+
+def test_appends_readings(client, tmp_path):
+    response = post(client, [['2022-06-01 13:00', -40.2], ['2022-06-01 14:00', None]])
+    assert response.status_code == 200
+    assert response.get_json() == {'appended': 2}
+    assert (tmp_path / 'SHIR22_WAT.csv').read_text().splitlines()[-2:] == ['06/01/22,13:00,-40.2', '06/01/22,14:00,']
+
+
+@pytest.mark.parametrize('readings', [
+    [[None, 1]],
+    [['not a time', 1]],
+    [['1962-01-01 00:00', 1]],
+    [['2022-06-01 13:00', 'abc']],
+    [['2022-06-01 13:00', True]],
+    [['2022-06-01 13:00', 1], [None, 2]],
+])
+def test_rejects_bad_readings(client, tmp_path, readings):
+    before = sorted(p.name for p in tmp_path.iterdir())
+    response = post(client, readings)
+    assert response.status_code == 400
+    assert sorted(p.name for p in tmp_path.iterdir()) == before
+    assert (tmp_path / 'SHIR22_WAT.csv').read_text() == 'date,hour,value\n06/01/22,12:00,-40.1\n'
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyramid import LEVELS, build_pyramid, extend_pyramid, pack_pyramid, pick_level, unpack_pyramid
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(5)
+    times = np.arange('2021-01-01T06', '2021-04-01', dtype='datetime64[h]')
+    times = times[rng.random(len(times)) > 0.1]
+    values = rng.normal(size=len(times))
+    values[rng.random(len(times)) < 0.1] = np.nan
+    values[100:200] = np.nan  # buckets without a single reading
+    return times, values
+
+
+def assert_levels_equal(actual, expected):
+    for name, _ in LEVELS:
+        for field in ('times', 'mean', 'min', 'max', 'count'):
+            np.testing.assert_array_equal(getattr(actual[name], field), getattr(expected[name], field),
+                                          err_msg=f"{name} {field}")
+
+
+def test_levels_match_pandas(series):
+    times, values = series
+    pyramid = build_pyramid(times, values)
+    frame = pd.Series(values, index=pd.DatetimeIndex(times))
+    epoch_hours = times.astype(np.int64)
+    for name, hours in LEVELS:
+        level = pyramid[name]
+        # Buckets are aligned to the epoch (weeks start on Thursdays), and a bucket exists
+        # when it holds a reading, even a missing one
+        grouped = frame.groupby(epoch_hours // hours * hours)
+        np.testing.assert_array_equal(level.times.astype(np.int64), grouped.size().index)
+        np.testing.assert_array_equal(level.count, grouped.count())
+        np.testing.assert_allclose(level.mean, grouped.mean(), equal_nan=True)
+        np.testing.assert_array_equal(level.min, grouped.min())
+        np.testing.assert_array_equal(level.max, grouped.max())
+
+
+@pytest.mark.parametrize('start', [1, 500, -3, -1])
+def test_extend_matches_rebuild(series, start):
+    times, values = series
+    start = start % len(times)
+    extended = extend_pyramid(build_pyramid(times[:start], values[:start]), times, values, start)
+    assert_levels_equal(extended, build_pyramid(times, values))
+
+
+def test_pack_round_trip(series):
+    pyramid = build_pyramid(*series)
+    assert_levels_equal(unpack_pyramid(pack_pyramid(pyramid)), pyramid)
+
+
+def test_empty_series():
+    pyramid = build_pyramid(np.array([], dtype='datetime64[h]'), np.array([]))
+    assert all(len(level.times) == 0 for level in pyramid.values())
+
+
+def test_pick_level():
+    assert pick_level(24 * 30, 1200) == 'hourly'
+    assert pick_level(24 * 365, 1200) == '6-hourly'
+    assert pick_level(24 * 365 * 4, 1200) == 'daily'
+    assert pick_level(24 * 7 * 5000, 1200) == 'weekly'
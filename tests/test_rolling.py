@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rolling import rolling_corr, rolling_mean_std, rolling_zscore
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(18)
+    a = 5000 + np.cumsum(rng.normal(size=2000))
+    b = 0.5 * a + rng.normal(scale=3, size=2000)
+    a[rng.random(2000) < 0.3] = np.nan
+    b[rng.random(2000) < 0.3] = np.nan
+    a[300:400] = np.nan
+    return a, b
+
+
+@pytest.mark.parametrize('window', [2, 24, 168])
+def test_mean_std_match_pandas(series, window):
+    a, _ = series
+    min_periods = max(2, window // 2)
+    count, mean, std = rolling_mean_std(a, window, min_periods)
+    rolling = pd.Series(a).rolling(window, min_periods=min_periods)
+    np.testing.assert_array_equal(count, pd.Series(a).notna().rolling(window, min_periods=1).sum())
+    np.testing.assert_allclose(mean, rolling.mean(), rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(std, rolling.std(), rtol=1e-6, atol=1e-7, equal_nan=True)
+
+
+def test_zscore_matches_pandas(series):
+    a, _ = series
+    rolling = pd.Series(a).rolling(48, min_periods=24)
+    expected = (pd.Series(a) - rolling.mean()) / rolling.std()
+    np.testing.assert_allclose(rolling_zscore(a, 48), expected, rtol=1e-6, equal_nan=True)
+
+
+def test_corr_matches_pandas(series):
+    a, b = series
+    # pandas pairs the readings both series have, like rolling_corr
+    both = ~(np.isnan(a) | np.isnan(b))
+    expected = pd.Series(np.where(both, a, np.nan)).rolling(72, min_periods=36).corr(
+        pd.Series(np.where(both, b, np.nan)))
+    np.testing.assert_allclose(rolling_corr(a, b, 72), expected, atol=1e-9, equal_nan=True)
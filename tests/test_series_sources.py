@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+from catalog import Catalog
+from series_append import append_year
+from series_cache import SeriesCache, load_series
+from series_store import SeriesStore, ingest
+
+
+def write_series(path, start, hours):
+    times = pd.date_range(start, periods=hours, freq='h')
+    pd.DataFrame({
+        'date': times.strftime('%m/%d/%y'),
+        'hour': times.strftime('%H:%M'),
+        'value': np.round(-40 + np.sin(np.arange(hours) / 24), 3),
+    }).to_csv(path, index=False)
+
+
+# SHIR21 is served from the binary store (hours), SHIR22 is parsed from its CSV
+# (nanoseconds) because it was written after the ingest
+@pytest.fixture
+def mixed_sources(tmp_path, monkeypatch):
+    write_series(tmp_path / 'SHIR21_WAT.csv', '2021-01-01', 24 * 60)
+    ingest(tmp_path, tmp_path / 'store')
+    write_series(tmp_path / 'SHIR22_WAT.csv', '2022-01-01', 24 * 60)
+    catalog = Catalog(tmp_path)
+    cache = SeriesCache(tmp_path, load_series, SeriesStore(tmp_path / 'store'), catalog)
+    monkeypatch.setattr(app, 'catalog', catalog)
+    monkeypatch.setattr(app, 'series_cache', cache)
+    return cache
+
+
+def test_years_come_from_both_sources(mixed_sources):
+    years = mixed_sources.get_years('SHIR', 'WAT')
+    assert years[21].times.dtype == np.dtype('datetime64[h]')
+    assert years[22].times.dtype == np.dtype('datetime64[ns]')
+
+
+@pytest.mark.parametrize('frequency', [1, 2, 'lttb', 'minmax', 'auto'])
+@pytest.mark.parametrize('renderer', ['webgl', 'svg'])
+@pytest.mark.parametrize('n_clicks', [0, 1])
+def test_figure_with_store_and_csv_years(mixed_sources, frequency, renderer, n_clicks):
+    fig = app.build_figure('WAT', 'SHIR', None, frequency, n_clicks, renderer)
+    assert len(fig.data) >= 2
+
+
+def test_merged_years_keep_datetime_dtype(mixed_sources):
+    series = mixed_sources.get_years('SHIR', 'WAT')
+    merged = app.merge_years([app.series_frame(data) for data in series.values()])
+    assert merged['datetime'].dtype == np.dtype('datetime64[ns]')
+    assert merged['datetime'].is_monotonic_increasing
+
+
+def test_extend_store_year(mixed_sources, tmp_path):
+    before = mixed_sources.get('SHIR', 'WAT', 21)
+    last = before.times[-1].astype('datetime64[ns]')
+    written = append_year(tmp_path / 'SHIR21_WAT.csv', np.array([last + np.timedelta64(1, 'h')]), np.array([-39.5]))
+    mixed_sources.catalog.touch(tmp_path / 'SHIR21_WAT.csv')
+    assert mixed_sources.extend('SHIR', 'WAT', 21, *written)
+    after = mixed_sources.get('SHIR', 'WAT', 21)
+    assert after.times.dtype == np.dtype('datetime64[ns]')
+    assert len(after.times) == len(before.times) + 1
+    app.build_figure('WAT', 'SHIR', None, 1, 1, 'svg')
+
+
+# Rows another process appended before ours must not be lost from the cached entry
+def test_extend_after_foreign_append(mixed_sources, tmp_path):
+    path = tmp_path / 'SHIR22_WAT.csv'
+    before = mixed_sources.get('SHIR', 'WAT', 22)
+    last = before.times[-1]
+    with open(path, 'a') as f:
+        f.write(pd.Timestamp(last + np.timedelta64(1, 'h')).strftime('%m/%d/%y,%H:%M') + ',-39.0\n')
+    written = append_year(path, np.array([last + np.timedelta64(2, 'h')]), np.array([-39.5]))
+    mixed_sources.catalog.touch(path)
+    assert not mixed_sources.extend('SHIR', 'WAT', 22, *written)
+    after = mixed_sources.get('SHIR', 'WAT', 22)
+    assert len(after.times) == len(before.times) + 2
+    assert list(after.values[-2:]) == [-39.0, -39.5]
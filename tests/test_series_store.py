@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+from series_store import FORMAT, SeriesStore, ingest, read_manifest, stat_stamp, write_manifest
+
+CSV = 'date,hour,value\n01/01/21,00:00,1\n01/01/21,01:00,2\n01/01/21,02:00,3\n'
+
+
+def test_entries_of_an_older_format_are_not_served(tmp_path):
+    (tmp_path / 'SHIR21_WAT.csv').write_text(CSV)
+    ingest(tmp_path, tmp_path / 'store')
+    store = SeriesStore(tmp_path / 'store')
+    stamp = stat_stamp(os.stat(tmp_path / 'SHIR21_WAT.csv'))
+    assert store.open('SHIR21_WAT', stamp) is not None
+    assert store.open_pyramid('SHIR21_WAT', stamp) is not None
+
+    manifest = read_manifest(tmp_path / 'store')
+    manifest['SHIR21_WAT']['format'] = FORMAT - 1
+    write_manifest(tmp_path / 'store', manifest)
+    assert store.open('SHIR21_WAT', stamp) is None
+    assert store.open_pyramid('SHIR21_WAT', stamp) is None
+
+
+def test_reingest_is_picked_up_without_reload(tmp_path):
+    store = SeriesStore(tmp_path / 'store')
+    (tmp_path / 'store').mkdir()
+    write_manifest(tmp_path / 'store', {})
+    assert store.manifest == {}
+
+    (tmp_path / 'SHIR21_WAT.csv').write_text(CSV)
+    ingest(tmp_path, tmp_path / 'store')
+    data = store.open('SHIR21_WAT', stat_stamp(os.stat(tmp_path / 'SHIR21_WAT.csv')))
+    assert np.asarray(data.values).tolist() == [1, 2, 3]
+
+
+# A worker still holding the old arrays keeps reading them after a re-ingest
+def test_reingest_leaves_mapped_arrays_intact(tmp_path):
+    path = tmp_path / 'SHIR21_WAT.csv'
+    path.write_text(CSV)
+    ingest(tmp_path, tmp_path / 'store')
+    store = SeriesStore(tmp_path / 'store')
+    old = store.open('SHIR21_WAT', stat_stamp(os.stat(path)))
+
+    path.write_text(CSV + '01/01/21,03:00,4\n')
+    ingest(tmp_path, tmp_path / 'store')
+    assert np.asarray(old.values).tolist() == [1, 2, 3]
+    new = store.open('SHIR21_WAT', stat_stamp(os.stat(path)))
+    assert np.asarray(new.values).tolist() == [1, 2, 3, 4]
+    assert not list((tmp_path / 'store').glob('*.tmp'))
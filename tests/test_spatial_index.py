@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from event_store import EventStore
+from spatial_index import STATION_COORDINATES, EventIndex, GridIndex, haversine_km, to_datetime64
+
+
+@pytest.fixture
+def events():
+    rng = np.random.default_rng(23)
+    n = 5000
+    return {
+        'datetime': np.datetime64('2021-01-01', 's') + rng.integers(0, 3 * 365 * 86400, n).astype('timedelta64[s]'),
+        'latitude': np.r_[rng.uniform(36, 45, n - 500), rng.uniform(68, 72, 500)],
+        'longitude': rng.uniform(38, 52, n),
+        'magnitude': rng.uniform(1, 6, n).round(1),
+    }
+
+
+# Positions and distances of the matching events by checking every one of them
+def full_scan(events, latitude, longitude, radius_km, start=None, end=None, min_magnitude=None):
+    distances = haversine_km(latitude, longitude, events['latitude'], events['longitude'])
+    keep = distances <= radius_km
+    if start is not None:
+        keep &= events['datetime'] >= to_datetime64(start)
+    if end is not None:
+        keep &= events['datetime'] < to_datetime64(end)
+    if min_magnitude is not None:
+        keep &= events['magnitude'] >= min_magnitude
+    positions = np.flatnonzero(keep)
+    positions = positions[np.argsort(events['datetime'][positions], kind='stable')]
+    return positions, distances[positions]
+
+
+@pytest.mark.parametrize('latitude, longitude, radius_km, start, end, min_magnitude', [
+    (40.0, 44.5, 100, None, None, None),
+    (40.0, 44.0, 55.6, '2022-01-01', '2022-07-01', 3.0),  # centre on a cell corner
+    (39.1, 46.2, 300, None, '2021-06-01', None),
+    (70.0, 45.0, 250, '2023-01-01', None, 2.5),  # cells narrow towards the pole
+    (40.6, 44.9, 0.5, None, None, None),
+    (10.0, 10.0, 100, None, None, None),  # nothing nearby
+])
+def test_within_matches_full_scan(events, latitude, longitude, radius_km, start, end, min_magnitude):
+    grid = GridIndex(events['datetime'], events['latitude'], events['longitude'], events['magnitude'])
+    positions, distances = grid.within(latitude, longitude, radius_km, start, end, min_magnitude)
+    expected_positions, expected_distances = full_scan(events, latitude, longitude, radius_km, start, end, min_magnitude)
+    np.testing.assert_array_equal(np.sort(positions), np.sort(expected_positions))
+    assert np.all(np.diff(events['datetime'][positions]) >= np.timedelta64(0, 's'))
+    np.testing.assert_allclose(np.sort(distances), np.sort(expected_distances))
+
+
+def test_empty_grid():
+    grid = GridIndex(np.array([], dtype='datetime64[s]'), [], [], [])
+    positions, distances = grid.within(40.0, 44.5, 100)
+    assert len(grid) == 0 and len(positions) == 0 and len(distances) == 0
+
+
+def test_event_index_over_a_store(tmp_path, events):
+    store = EventStore(tmp_path / 'earthquakes.db')
+    rows = [{'latitude': lat, 'longitude': lon, 'date_time': pd.Timestamp(t).to_pydatetime(), 'magnitude': m}
+            for t, lat, lon, m in zip(events['datetime'][:1000], events['latitude'][:1000],
+                                      events['longitude'][:1000], events['magnitude'][:1000])]
+    store.insert(rows)
+    index = EventIndex(store)
+
+    latitude, longitude = STATION_COORDINATES['ARTA']
+    near = index.near_station('ARTA', 150, '2022-01-01', '2023-01-01', 2.0)
+    subset = {name: values[:1000] for name, values in events.items()}
+    positions, distances = full_scan(subset, latitude, longitude, 150, '2022-01-01', '2023-01-01', 2.0)
+    assert sorted(near['datetime']) == sorted(pd.to_datetime(subset['datetime'][positions]))
+    np.testing.assert_allclose(np.sort(near['distance_km']), np.sort(distances))
+
+    timeline = index.timeline('ARTA', 150)
+    assert index.timeline('ARTA', 150) is timeline
+    between = timeline.between('2022-01-01', '2022-02-01')
+    expected = full_scan(subset, latitude, longitude, 150, '2022-01-01', '2022-02-01 00:00:01')[0]
+    assert len(between) == len(expected)
+
+    # A new event changes the table version, so the timeline is rebuilt
+    store.insert([{'latitude': latitude, 'longitude': longitude, 'date_time': '2022-01-15', 'magnitude': 4.0}])
+    assert len(index.timeline('ARTA', 150).between('2022-01-01', '2022-02-01')) == len(expected) + 1
+    store.close()
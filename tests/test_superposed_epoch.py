@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from superposed_epoch import CONFIDENCE_Z, gather_windows, hourly_grid, normalize_windows, stack_windows
+
+
+@pytest.fixture
+def grids():
+    rng = np.random.default_rng(25)
+    grids, events = [], []
+    for start, hours in ((1000, 2000), (1500, 800), (5000, 0)):
+        values = rng.normal(size=hours)
+        values[rng.random(hours) < 0.2] = np.nan
+        grids.append((start, values))
+        # Events inside, at the edges of and outside every series
+        events.append(np.r_[rng.integers(start - 100, start + hours + 100, 30), start - 60, start + hours + 30])
+    return grids, events
+
+
+# Window of one event cut out one value at a time
+def window_of(grid, event, before, after):
+    start, values = grid
+    window = np.full(before + after + 1, np.nan)
+    for i, hour in enumerate(range(event - before, event + after + 1)):
+        if 0 <= hour - start < len(values):
+            window[i] = values[hour - start]
+    return window
+
+
+def test_hourly_grid():
+    times = np.array(['2021-01-01T03', '2021-01-01T00', '2021-01-01T03', '2021-01-01T05'], dtype='datetime64[h]')
+    start, grid = hourly_grid(times, [1.0, 2.0, 3.0, 4.0])
+    assert start == np.datetime64('2021-01-01T00', 'h').astype(np.int64)
+    np.testing.assert_array_equal(grid, [2.0, np.nan, np.nan, 3.0, np.nan, 4.0])
+    assert len(hourly_grid(np.array([], dtype='datetime64[h]'), [])[1]) == 0
+
+
+def test_gather_windows_matches_loop(grids):
+    grids, events = grids
+    before, after = 48, 24
+    matrix, owners = gather_windows(grids, events, before, after)
+    expected, expected_owners = [], []
+    for index, (grid, hours) in enumerate(zip(grids, events)):
+        for event in hours:
+            window = window_of(grid, event, before, after)
+            # Windows that miss the series entirely are left out
+            if event - before < grid[0] + len(grid[1]) and event + after >= grid[0]:
+                expected.append(window)
+                expected_owners.append(index)
+    np.testing.assert_array_equal(matrix, np.array(expected))
+    np.testing.assert_array_equal(owners, expected_owners)
+
+
+def test_stack_windows_matches_nan_statistics(grids):
+    grids, events = grids
+    matrix, _ = gather_windows(grids, events, 48, 24)
+    expected = matrix.copy()
+    stack = stack_windows(matrix, 48)
+    count = (~np.isnan(expected)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(expected, axis=0) / count
+        std = np.sqrt(np.nansum((expected - mean) ** 2, axis=0) / (count - 1))
+    margin = np.where(count > 1, CONFIDENCE_Z * std / np.sqrt(count), np.nan)
+    np.testing.assert_array_equal(stack.count, count)
+    np.testing.assert_allclose(stack.mean, np.where(count > 0, mean, np.nan), equal_nan=True)
+    np.testing.assert_allclose(stack.lower, stack.mean - margin, equal_nan=True)
+    np.testing.assert_allclose(stack.upper, stack.mean + margin, equal_nan=True)
+    np.testing.assert_allclose(stack.offsets[[0, 48, -1]], [-2.0, 0.0, 1.0])
+    assert stack.windows == (~np.isnan(expected)).any(axis=1).sum()
+
+
+def test_normalize_windows_matches_loop(grids):
+    grids, events = grids
+    matrix, owners = gather_windows(grids, events, 48, 24)
+    scales = np.array([np.nanstd(values) if len(values) else np.nan for _, values in grids])
+    expected = matrix.copy()
+    for row, owner in zip(expected, owners):
+        with np.errstate(invalid='ignore'):
+            pre = row[:48]
+            baseline = pre[~np.isnan(pre)].mean() if (~np.isnan(pre)).any() else np.nan
+        row[:] = (row - baseline) / scales[owner]
+    np.testing.assert_allclose(normalize_windows(matrix, owners, scales, 48), expected, equal_nan=True)
+
+
+def test_no_windows():
+    matrix, owners = gather_windows([], [], 48, 24)
+    stack = stack_windows(matrix, 48)
+    assert matrix.shape == (0, 73) and len(owners) == 0
+    assert stack.windows == 0 and np.isnan(stack.mean).all()
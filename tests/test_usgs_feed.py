@@ -0,0 +1,130 @@
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from event_store import EventStore
+from usgs_feed import FeedPoller, parse_feature
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'all_day.geojson'
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    # Serves server.payload with an ETag and answers 304 when the client sends it back
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        etag = f'"{self.server.version}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.server.statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.server.payload.encode()
+        self.server.statuses.append(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def feed_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    server.payload, server.version = FIXTURE.read_text(), 1
+    server.requests, server.statuses = [], []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(tmp_path / 'earthquakes.db')
+    yield store
+    store.close()
+
+
+def url_of(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/all_day.geojson'
+
+
+def test_parse_feature():
+    feature = json.loads(FIXTURE.read_text())['features'][0]
+    assert parse_feature(feature) == {
+        'event_id': 'us7000kf1a',
+        'latitude': 39.88,
+        'longitude': 44.45,
+        'date_time': 1691452800000,
+        'magnitude': 4.2,
+        'intensity': '3.9',
+        'place': '12 km SW of Artashat, Armenia',
+    }
+
+
+def test_conditional_get(feed_server, store):
+    poller = FeedPoller(url_of(feed_server), store)
+    assert poller.poll() is True
+    assert poller.poll() is False
+    assert 'If-None-Match' not in feed_server.requests[0]
+    assert feed_server.requests[1]['If-None-Match'] == '"1"'
+    assert feed_server.statuses == [200, 304]
+
+
+def test_features_without_magnitude_are_skipped(feed_server, store):
+    poller = FeedPoller(url_of(feed_server), store)
+    poller.poll()
+    assert [f['event_id'] for f in poller.features] == ['us7000kf1a', 'us7000kf2b']
+    assert store.count() == 2
+
+
+def test_repolled_and_revised_events_are_stored_once(feed_server, store):
+    poller = FeedPoller(url_of(feed_server), store)
+    poller.poll()
+    payload = json.loads(feed_server.payload)
+    payload['features'][0]['properties']['mag'] = 4.3
+    feed_server.payload, feed_server.version = json.dumps(payload), 2
+    assert poller.poll() is True
+    events = {e.event_id: e.magnitude for e in store.window()}
+    assert events == {'us7000kf1a': 4.3, 'us7000kf2b': 2.7}
+
+
+def test_local_fixture_file(tmp_path, store):
+    path = tmp_path / 'all_day.geojson'
+    path.write_text(FIXTURE.read_text())
+    for url in (str(path), path.as_uri()):
+        poller = FeedPoller(url, store)
+        assert poller.poll() is True
+        assert poller.poll() is False
+        assert len(poller.features) == 2
+    assert store.count() == 2
+
+
+def test_null_coordinates_are_skipped():
+    feature = {'id': 'us7000kf3c', 'properties': {'time': 1691452800000, 'mag': 3.1}, 'geometry': {'coordinates': None}}
+    assert parse_feature(feature)['latitude'] is None
+    assert parse_feature({'id': 'us7000kf3c', 'properties': {}, 'geometry': None})['longitude'] is None
+
+
+# A feed whose events could not be saved is fetched in full again, not answered with a 304
+def test_failed_insert_keeps_old_validators(feed_server, store, monkeypatch):
+    poller = FeedPoller(url_of(feed_server), store)
+
+    def locked(events):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(store, 'insert_new', locked)
+    with pytest.raises(sqlite3.OperationalError):
+        poller.poll()
+    monkeypatch.undo()
+    assert poller.poll() is True
+    assert feed_server.statuses == [200, 200]
+    assert store.count() == 2